@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the personal data redaction and hashing paths.
+Covers `filter_datum` (against the original uncompiled regex),
+`Redactor.redact`, `RedactingFormatter.format`, `hash_password` and
+`is_valid` over several message sizes, field counts, separators and
+bcrypt costs, and reports throughput, mean and per-call latency
+percentiles. No database is needed.
+
+Usage:
+    ./benchmark.py --save baseline.json
+    ./benchmark.py --compare baseline.json --threshold 0.15
+"""
+import argparse
+import json
+import logging
+import math
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+from encrypt_password import hash_password, is_valid
+from filtered_logger import (
+    PII_FIELDS, Redactor, RedactingFormatter, filter_datum, patterns
+)
+
+LENGTHS = (64, 1024, 4096)
+FIELD_COUNTS = (1, 5)
+SEPARATORS = (";", "&")
+COSTS = (4, 6, 8)
+REDACTION = "***"
+
+
+def make_message(length: int, fields: List[str], pii: bool = True) -> str:
+    """
+    Build a `key=value;` message of roughly `length` characters.
+    Args:
+        length (int): Target message length.
+        fields (List[str]): Redacted fields to embed when `pii` is set.
+        pii (bool): Whether the message carries any redacted field.
+    Returns:
+        str: The generated message.
+    """
+    parts = []
+    if pii:
+        parts = ["{}=value_{}".format(f, i) for i, f in enumerate(fields)]
+    i = 0
+    while len(";".join(parts)) < length:
+        parts.append("attr{}=some_value_{}".format(i, i))
+        i += 1
+    return ";".join(parts) + ";"
+
+
+def baseline_filter_datum(
+    fields: List[str], redaction: str, message: str, separator: str
+) -> str:
+    """
+    The original, uncompiled `filter_datum`, kept as a reference point.
+    """
+    extract_pattern = patterns["extract"](fields, separator)
+    replace_pattern = patterns["replace"](redaction)
+    return re.sub(extract_pattern, replace_pattern, message)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of sorted samples.
+    """
+    rank = max(1, math.ceil(pct / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+def timer_overhead(samples: int = 10000) -> float:
+    """
+    Median time, in seconds, between two back-to-back timer reads.
+    """
+    clock = time.perf_counter
+    deltas = []
+    for _ in range(samples):
+        before = clock()
+        deltas.append(clock() - before)
+    deltas.sort()
+    return deltas[len(deltas) // 2]
+
+
+def measure(func: Callable[[], object], seconds: float,
+            overhead: float = 0.0) -> Dict[str, float]:
+    """
+    Call `func` for about `seconds`, timing every call on its own.
+    Args:
+        func (Callable): Function to benchmark.
+        seconds (float): Time budget of the case.
+        overhead (float): Timer overhead subtracted from each call, see
+            `timer_overhead`.
+    Returns:
+        Dict[str, float]: ops/s, then the mean and p50/p95/p99 latencies
+            per call in microseconds.
+    """
+    clock = time.perf_counter
+    latencies = []
+    start = clock()
+    deadline = start + seconds
+    while True:
+        before = clock()
+        func()
+        after = clock()
+        latencies.append(max(after - before - overhead, 0.0) * 1e6)
+        if after >= deadline and len(latencies) >= 5:
+            break
+    latencies.sort()
+    return {
+        "ops_per_sec": len(latencies) / (after - start),
+        "mean_us": sum(latencies) / len(latencies),
+        "p50_us": percentile(latencies, 50),
+        "p95_us": percentile(latencies, 95),
+        "p99_us": percentile(latencies, 99),
+    }
+
+
+def redaction_cases() -> Dict[str, Callable[[], object]]:
+    """
+    Build the `filter_datum`, `Redactor.redact` and
+    `RedactingFormatter.format` cases, checking first that the compiled
+    redaction matches the original regex.
+    """
+    cases = {}
+    for length in LENGTHS:
+        for n_fields in FIELD_COUNTS:
+            fields = list(PII_FIELDS[:n_fields])
+            for sep in SEPARATORS:
+                msg = make_message(length, fields).replace(";", sep)
+                name = "len={},fields={},sep={}".format(length, n_fields, sep)
+                cases["filter_datum[{}]".format(name)] = (
+                    lambda f=fields, m=msg, s=sep: filter_datum(
+                        f, REDACTION, m, s))
+            redactor = Redactor(fields, REDACTION, ";")
+            for pii in (True, False):
+                msg = make_message(length, fields, pii)
+                assert redactor.redact(msg) == baseline_filter_datum(
+                    fields, REDACTION, msg, ";")
+                name = "len={},fields={},pii={}".format(
+                    length, n_fields, "yes" if pii else "no")
+                cases["baseline_filter_datum[{}]".format(name)] = (
+                    lambda f=fields, m=msg: baseline_filter_datum(
+                        f, REDACTION, m, ";"))
+                cases["redact[{}]".format(name)] = (
+                    lambda r=redactor, m=msg: r.redact(m))
+            formatter = RedactingFormatter(fields)
+            record = logging.LogRecord("user_data", logging.INFO, None,
+                                       None, make_message(length, fields),
+                                       None, None)
+            name = "len={},fields={}".format(length, n_fields)
+            cases["format[{}]".format(name)] = (
+                lambda fmt=formatter, r=record: fmt.format(r))
+    return cases
+
+
+def hashing_cases(costs=COSTS) -> Dict[str, Callable[[], object]]:
+    """
+    Build the `hash_password` and `is_valid` cases.
+    """
+    cases = {}
+    for cost in costs:
+        hashed = hash_password("benchmark password", cost)
+        cases["hash_password[cost={}]".format(cost)] = (
+            lambda c=cost: hash_password("benchmark password", c))
+        cases["is_valid[cost={}]".format(cost)] = (
+            lambda h=hashed: is_valid(h, "benchmark password"))
+    return cases
+
+
+def run(seconds: float, costs=COSTS) -> Dict[str, Dict[str, float]]:
+    """
+    Run every case and print one line per result.
+    """
+    results = {}
+    overhead = timer_overhead()
+    cases = redaction_cases()
+    cases.update(hashing_cases(costs))
+    for name, func in cases.items():
+        result = results[name] = measure(func, seconds, overhead)
+        print("{:<50} {:>10.0f} ops/s  mean {:>9.1f}us  p50 {:>9.1f}us"
+              "  p95 {:>9.1f}us  p99 {:>9.1f}us".format(
+                  name, result["ops_per_sec"], result["mean_us"],
+                  result["p50_us"], result["p95_us"], result["p99_us"]))
+    return results
+
+
+def regressions(results: Dict[str, Dict[str, float]],
+                baseline: Dict[str, Dict[str, float]],
+                threshold: float) -> List[str]:
+    """
+    List the cases whose throughput dropped by more than `threshold`
+    (a fraction) relative to the baseline.
+    """
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["ops_per_sec"]
+        after = result["ops_per_sec"]
+        if after < before * (1 - threshold):
+            failures.append("{}: {:.0f} -> {:.0f} ops/s ({:+.1%})".format(
+                name, before, after, after / before - 1))
+    return failures
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run the suite, optionally saving or comparing with a JSON baseline.
+    Returns:
+        int: 1 when a regression exceeds the threshold, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=0.5,
+                        help="time budget per case")
+    parser.add_argument("--costs", type=int, nargs="+", default=COSTS,
+                        help="bcrypt costs to benchmark")
+    parser.add_argument("--save", metavar="FILE",
+                        help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed throughput drop, as a fraction")
+    args = parser.parse_args(argv)
+
+    results = run(args.seconds, args.costs)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        failures = regressions(results, baseline, args.threshold)
+        for failure in failures:
+            print("REGRESSION " + failure, file=sys.stderr)
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+This module exports the users table to Arrow IPC or Parquet files.
+Rows are fetched in batches and turned into Arrow record batches, and
+the PII columns are masked as whole columns instead of being rendered
+as `key=value;` strings and redacted with a regex. Their values are never
+converted, so they may be of any type.
+"""
+import os
+from typing import Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet
+
+from filtered_logger import (
+    BATCH_SIZE, PII_FIELDS, USER_FIELDS, ExportStats, RedactingFormatter,
+    build_query, get_pool, get_progress_logger, stream_rows
+)
+
+# Arrow types of the exported columns; the others, including every
+# masked PII column, are strings
+COLUMN_TYPES = {"last_login": pa.timestamp("us")}
+
+SCHEMA = pa.schema([
+    (column, COLUMN_TYPES.get(column, pa.string())) for column in USER_FIELDS
+])
+
+FORMATS = ("parquet", "arrow")
+
+
+def rows_to_batch(
+    rows: list,
+    schema: pa.Schema = SCHEMA,
+    masked: Sequence[str] = PII_FIELDS,
+    redaction: str = RedactingFormatter.REDACTION
+) -> pa.RecordBatch:
+    """
+    Convert fetched row tuples to a record batch, with the `masked`
+    columns replaced by the redaction string without reading them.
+    Args:
+        rows (list): Row tuples, in `schema` column order.
+        schema (pa.Schema): Schema of the batch; masked columns are strings.
+        masked (Sequence[str]): Columns to redact.
+        redaction (str): Redaction string.
+    Returns:
+        pa.RecordBatch: The rows as columns.
+    """
+    columns = zip(*rows) if rows else [()] * len(schema)
+    arrays = [
+        pa.repeat(redaction, len(rows)) if field.name in masked
+        else pa.array(values, type=field.type)
+        for values, field in zip(columns, schema)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_columnar(
+    connection, path: str, file_format: str = "parquet",
+    batch_size: int = BATCH_SIZE, pushdown: bool = True,
+    progress=None
+) -> ExportStats:
+    """
+    Write the users table to a columnar file, with PII_FIELDS masked.
+    Args:
+        connection: Database connection.
+        path (str): Output file.
+        file_format (str): `parquet` or `arrow` (Arrow IPC file).
+        batch_size (int): Number of rows per fetch and per record batch.
+        pushdown (bool): Also redact PII_FIELDS in the SELECT itself, so
+            their values are never fetched. Without it they are fetched
+            but still masked.
+        progress (Callable): Called with the counters after each batch.
+    Returns:
+        ExportStats: Final counters.
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if file_format not in FORMATS:
+        raise ValueError("unknown format {!r}, expected one of {}".format(
+            file_format, FORMATS))
+    if file_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(path, SCHEMA)
+    else:
+        writer = pyarrow.ipc.new_file(path, SCHEMA)
+    query = build_query(redacted=PII_FIELDS if pushdown else ())
+    stats = ExportStats()
+    try:
+        for rows in stream_rows(connection, query, batch_size):
+            writer.write_batch(rows_to_batch(rows))
+            stats.rows += len(rows)
+            stats.batches += 1
+            if progress is not None:
+                progress(stats)
+    finally:
+        writer.close()
+    return stats
+
+
+def main(file_format: str, batch_size: int = BATCH_SIZE,
+         path: Optional[str] = None) -> None:
+    """
+    Export the users table to `PERSONAL_DATA_EXPORT_FILE`, defaulting to
+    `users.parquet` or `users.arrow`.
+    Args:
+        file_format (str): `parquet` or `arrow`.
+        batch_size (int): Number of rows per batch.
+        path (str): Output file.
+    """
+    if path is None:
+        path = os.getenv("PERSONAL_DATA_EXPORT_FILE",
+                         "users.{}".format(file_format))
+    with get_pool().connection() as connection:
+        stats = export_columnar(connection, path, file_format, batch_size)
+    get_progress_logger().info("{} to {}".format(stats, path))
+
+
+if __name__ == "__main__":
+    main(os.getenv("PERSONAL_DATA_EXPORT_FORMAT", "parquet"),
+         int(os.getenv("PERSONAL_DATA_BATCH_SIZE", BATCH_SIZE)))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+This module pools database connections.
+It also provides a SQLite-backed stand-in for `mysql.connector`
+connections, so that the exports can run without a MySQL server.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+class SQLiteCursor:
+    """
+    Cursor of a SQLiteConnection, accepting `%s` placeholders and
+    usable as a context manager like a `mysql.connector` cursor.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def __enter__(self) -> "SQLiteCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def execute(self, query: str, params=()) -> None:
+        """
+        Run a query written with `mysql.connector` placeholders.
+        """
+        self._cursor.execute(query.replace("%s", "?"), params)
+
+    def fetchone(self):
+        """
+        Fetch the next row.
+        """
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int) -> list:
+        """
+        Fetch the next `size` rows.
+        """
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self) -> list:
+        """
+        Fetch the remaining rows.
+        """
+        return self._cursor.fetchall()
+
+    def close(self) -> None:
+        """
+        Close the cursor.
+        """
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    Stand-in for a `mysql.connector` connection backed by a SQLite file.
+    """
+
+    def __init__(self, database: str):
+        self._connection = sqlite3.connect(
+            database or ":memory:",
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        self._closed = False
+
+    def cursor(self, buffered: bool = None) -> SQLiteCursor:
+        """
+        Open a cursor. SQLite cursors always stream, so `buffered` is
+        accepted for compatibility and ignored.
+        """
+        return SQLiteCursor(self._connection.cursor())
+
+    def is_connected(self) -> bool:
+        """
+        Check that the connection is still usable.
+        """
+        if self._closed:
+            return False
+        try:
+            self._connection.execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def commit(self) -> None:
+        """
+        Commit the current transaction.
+        """
+        self._connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the connection.
+        """
+        self._closed = True
+        self._connection.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of at most `size` borrowed connections made by
+    `connect`. Idle connections are reused most-recently-released first
+    and are health-checked with `is_connected()` before being handed out.
+    """
+
+    def __init__(self, connect: Callable, size: int = 4,
+                 timeout: Optional[float] = None):
+        """
+        Create an empty pool; connections are opened on demand.
+        Args:
+            connect (Callable): Factory opening a new connection.
+            size (int): Maximum number of connections borrowed at once.
+            timeout (float): Seconds to wait for a free connection.
+        """
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self):
+        """
+        Take a healthy idle connection, or open a new one, waiting while
+        `size` connections are already borrowed.
+        Returns:
+            A database connection.
+        Raises:
+            TimeoutError: If no connection is freed within `timeout`.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("no database connection available")
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
+                if self._is_healthy(connection):
+                    return connection
+                self._close(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection) -> None:
+        """
+        Give a borrowed connection back to the pool.
+        """
+        if self._closed:
+            self._close(connection)
+        else:
+            self._idle.put(connection)
+        self._slots.release()
+
+    def discard(self, connection) -> None:
+        """
+        Close a borrowed connection instead of giving it back.
+        """
+        self._close(connection)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """
+        Borrow a connection for the duration of a `with` block.
+        A connection left in an unknown state by an exception is discarded
+        rather than reused.
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.discard(connection)
+            raise
+        self.release(connection)
+
+    def close(self) -> None:
+        """
+        Close the idle connections; borrowed ones are closed on release.
+        """
+        self._closed = True
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _close(connection) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(connection) -> bool:
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
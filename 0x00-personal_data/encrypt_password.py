@@ -1,18 +1,70 @@
 #!/usr/bin/env python3
+import os
+import math
+import time
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, Union
+
 import bcrypt
 
+# Range of costs accepted by bcrypt
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+
+# Cost used by hash_password: BCRYPT_ROUNDS, or the bcrypt default of 12,
+# until set_rounds or calibrate_cost picks one for this host
+_rounds = 12
+
+
+def get_rounds() -> int:
+    """
+    Returns the bcrypt cost currently used by hash_password.
+    """
+    return _rounds
+
+
+def set_rounds(rounds: Union[int, str]) -> None:
+    """
+    Sets the bcrypt cost used by hash_password.
+
+    Args:
+        rounds: bcrypt cost (log2 of the number of rounds), as an int or
+            as the decimal string of an environment variable.
+
+    Raises:
+        ValueError: If the cost is not an integer bcrypt accepts.
+    """
+    global _rounds
+    if isinstance(rounds, str) and rounds.strip().isdigit():
+        rounds = int(rounds)
+    if type(rounds) is not int or not MIN_ROUNDS <= rounds <= MAX_ROUNDS:
+        raise ValueError(
+            "bcrypt cost must be an integer between {} and {}, not {!r}"
+            .format(MIN_ROUNDS, MAX_ROUNDS, rounds))
+    _rounds = rounds
+
+
+try:
+    set_rounds(os.getenv("BCRYPT_ROUNDS", "12"))
+except ValueError as e:
+    raise ValueError("BCRYPT_ROUNDS: {}".format(e)) from None
 
-def hash_password(password: str) -> bytes:
+
+def hash_password(password: str, rounds: Optional[int] = None) -> bytes:
     """
     Hashes a password using bcrypt.
 
     Args:
         password: Plain text password.
+        rounds: bcrypt cost, get_rounds() by default.
 
     Returns:
         Salted, hashed password as bytes.
     """
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    salt = bcrypt.gensalt(rounds or _rounds)
+    return bcrypt.hashpw(password.encode(), salt)
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
@@ -27,3 +79,184 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         True if passwords match, False otherwise.
     """
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def cost_of(hashed_password: bytes) -> int:
+    """
+    Reads the bcrypt cost of a hashed password.
+
+    Args:
+        hashed_password: Hashed password as bytes, e.g. `$2b$12$...`.
+
+    Returns:
+        The cost the password was hashed with.
+    """
+    return int(hashed_password.split(b"$")[2])
+
+
+def verify_and_rehash(
+    hashed_password: bytes, password: str
+) -> Tuple[bool, Optional[bytes]]:
+    """
+    Validates a password and rehashes it when it was stored with another
+    cost than the current one, so that stored hashes follow calibration.
+
+    Args:
+        hashed_password: Hashed password as bytes.
+        password: Plain text password.
+
+    Returns:
+        Whether the password matches, and the new hash to store, or None
+        if the stored one is still current.
+    """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if cost_of(hashed_password) == _rounds:
+        return True, None
+    return True, hash_password(password)
+
+
+def measure_cost(rounds: int, samples: int = 5,
+                 percentile: float = 95) -> float:
+    """
+    Measures the latency of hashing a password at a given cost.
+
+    Args:
+        rounds: bcrypt cost.
+        samples: Number of hashes timed.
+        percentile: Latency percentile reported (nearest rank).
+
+    Returns:
+        The latency percentile in milliseconds.
+    """
+    salt = bcrypt.gensalt(rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration password", salt)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    rank = max(1, math.ceil(percentile / 100 * samples))
+    return timings[rank - 1]
+
+
+def calibrate_cost(
+    target_ms: float = 250,
+    samples: int = 5,
+    percentile: float = 95,
+    min_rounds: int = 10,
+    apply: bool = True
+) -> int:
+    """
+    Picks the highest bcrypt cost whose latency percentile on this host
+    fits a target.
+
+    Each extra cost doubles the work, so costs are measured upward and
+    the search stops as soon as the next one is expected to exceed the
+    target, without paying for it. `min_rounds` is returned even when it
+    is already over budget.
+
+    Args:
+        target_ms: Latency budget of one hash, in milliseconds.
+        samples: Number of hashes timed per cost.
+        percentile: Latency percentile compared with the budget.
+        min_rounds: Lowest cost ever picked.
+        apply: Also make it the cost used by hash_password.
+
+    Returns:
+        The chosen cost.
+    """
+    rounds = min_rounds
+    latency = measure_cost(rounds, samples, percentile)
+    while rounds < MAX_ROUNDS and latency * 2 <= target_ms:
+        next_latency = measure_cost(rounds + 1, samples, percentile)
+        if next_latency > target_ms:
+            break
+        rounds += 1
+        latency = next_latency
+    if apply:
+        set_rounds(rounds)
+    return rounds
+
+
+def _is_valid_pair(pair: Tuple[bytes, str]) -> bool:
+    """
+    Validates a `(hashed_password, password)` pair.
+    """
+    return is_valid(*pair)
+
+
+def _pool_map(
+    func: Callable, items: Iterable, workers: Optional[int], processes: bool
+) -> Iterator:
+    """
+    Maps `func` over `items` on a worker pool, in input order.
+
+    At most two items per worker are in flight, so a generator input is
+    consumed as results are taken rather than all at once.
+
+    Args:
+        func: Function applied to each item (top-level for processes).
+        items: Input items, possibly a generator.
+        workers: Pool size, the number of CPUs by default.
+        processes: Use a process pool instead of a thread pool.
+
+    Yields:
+        The results of `func`, in the order of `items`.
+    """
+    workers = workers or os.cpu_count() or 1
+    pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    executor = pool_class(workers)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def hash_many(
+    passwords: Iterable[str],
+    workers: Optional[int] = None,
+    processes: bool = False
+) -> Iterator[bytes]:
+    """
+    Hashes many passwords in parallel.
+
+    bcrypt releases the GIL while hashing, so the default thread pool
+    already scales across cores. The current cost is passed explicitly,
+    so process workers use it too.
+
+    Args:
+        passwords: Plain text passwords, possibly a generator.
+        workers: Number of workers, the number of CPUs by default.
+        processes: Use worker processes instead of threads.
+
+    Returns:
+        An iterator of hashed passwords, in input order.
+    """
+    func = functools.partial(hash_password, rounds=_rounds)
+    return _pool_map(func, passwords, workers, processes)
+
+
+def verify_many(
+    pairs: Iterable[Tuple[bytes, str]],
+    workers: Optional[int] = None,
+    processes: bool = False
+) -> Iterator[bool]:
+    """
+    Validates many `(hashed_password, password)` pairs in parallel.
+
+    Args:
+        pairs: Hashed and plain text passwords, possibly a generator.
+        workers: Number of workers, the number of CPUs by default.
+        processes: Use worker processes instead of threads.
+
+    Returns:
+        An iterator of booleans, in input order.
+    """
+    return _pool_map(_is_valid_pair, pairs, workers, processes)
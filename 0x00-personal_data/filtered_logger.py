@@ -4,9 +4,18 @@ This module filters logs.
 """
 import os
 import re
+import copy
+import time
+import queue
+import atexit
 import logging
+import functools
+import json
+import multiprocessing
 import mysql.connector
-from typing import List
+from db_pool import ConnectionPool, SQLiteConnection
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Iterator, List, Optional, Sequence
 
 # Define patterns for extracting and replacing PII data
 patterns = {
@@ -17,6 +26,84 @@ patterns = {
 # List of PII fields
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
 
+# Columns exported from the users table, in output order
+USER_FIELDS = PII_FIELDS + ("ip", "last_login", "user_agent")
+
+# Default number of rows fetched per round trip by the export
+BATCH_SIZE = 1000
+
+# Default capacity of the asynchronous logging queue
+QUEUE_CAPACITY = 10000
+
+# Listeners started by `get_logger`, stopped by `shutdown_logging`
+_listeners = []
+
+# Queue handlers of `get_logger`, whose drops `shutdown_logging` reports
+_handlers = []
+
+# Connection pools of `get_pool`, one per process
+_pools = {}
+
+
+class Redactor:
+    """
+    Reusable redaction engine for a fixed set of fields.
+    The extract/replace patterns are compiled once, and messages that
+    contain none of the `<field>=` keys are returned without running
+    the regex at all.
+    """
+
+    def __init__(
+        self, fields: Sequence[str], redaction: str, separator: str
+    ):
+        """
+        Compile the redaction patterns.
+        Args:
+            fields (Sequence[str]): Fields to redact.
+            redaction (str): Redaction string.
+            separator (str): Separator used in the log messages.
+        """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self._pattern = re.compile(patterns["extract"](self.fields, separator))
+        self._replace = patterns["replace"](redaction)
+        # Fields are spliced into the pattern as regex alternatives, so the
+        # substring pre-check is only equivalent when every field is literal.
+        # An empty field list still leaves one (empty) alternative.
+        alternatives = self.fields or ("",)
+        if all(re.escape(field) == field for field in alternatives):
+            self._needles = tuple(field + "=" for field in alternatives)
+        else:
+            self._needles = None
+
+    def redact(self, message: str) -> str:
+        """
+        Redact the configured fields in a message.
+        Args:
+            message (str): Log message.
+        Returns:
+            str: The redacted message, identical to `filter_datum`.
+        """
+        needles = self._needles
+        if needles is not None:
+            for needle in needles:
+                if needle in message:
+                    break
+            else:
+                return message
+        return self._pattern.sub(self._replace, message)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_redactor(
+    fields: Sequence[str], redaction: str, separator: str
+) -> Redactor:
+    """
+    Return a cached Redactor for the given arguments.
+    """
+    return Redactor(fields, redaction, separator)
+
 
 def filter_datum(
     fields: List[str], redaction: str, message: str, separator: str
@@ -31,66 +118,461 @@ def filter_datum(
     Returns:
         str: The redacted log message.
     """
-    extract_pattern = patterns["extract"](fields, separator)
-    replace_pattern = patterns["replace"](redaction)
-    return re.sub(extract_pattern, replace_pattern, message)
+    redactor = _get_redactor(tuple(fields), redaction, separator)
+    return redactor.redact(message)
+
+
+def redact_mapping(data: Any, fields: Sequence[str], redaction: str) -> Any:
+    """
+    Redact the values of the given keys in structured data, at any depth.
+    Args:
+        data (Any): Dicts, lists and tuples of values to redact.
+        fields (Sequence[str]): Keys whose values are redacted.
+        redaction (str): Redaction string.
+    Returns:
+        Any: A redacted copy of the containers; other values are shared.
+    """
+    if isinstance(data, dict):
+        return {
+            key: redaction if key in fields
+            else redact_mapping(value, fields, redaction)
+            for key, value in data.items()
+        }
+    if isinstance(data, (list, tuple)):
+        return [redact_mapping(value, fields, redaction) for value in data]
+    return data
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queue handler for the asynchronous mode of `get_logger`.
+    Records are enqueued unformatted, so redaction and I/O run on the
+    listener thread, and a full queue either blocks or drops records.
+    """
+
+    def __init__(self, log_queue, block: bool = True):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge the message arguments and render any traceback, so that the
+        record can be pickled across processes. Formatting is left to the
+        listener, and a message without arguments, such as a structured
+        payload, is passed as is.
+        Args:
+            record (logging.LogRecord): Log record.
+        Returns:
+            logging.LogRecord: A copy safe to enqueue.
+        """
+        record = copy.copy(record)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Put a record on the queue, counting it as dropped when the queue
+        is full and the policy does not block.
+        Args:
+            record (logging.LogRecord): Prepared log record.
+        """
+        try:
+            if self.block:
+                self.queue.put(record)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """
+    Queue listener whose stop sentinel waits for room in a bounded queue,
+    so that every queued record is handled before the thread exits.
+    Stopping it more than once is harmless.
+    """
+
+    def stop(self) -> None:
+        """
+        Stop the listener thread after the queued records are handled.
+        """
+        if self._thread is not None:
+            super().stop()
+
+    def enqueue_sentinel(self) -> None:
+        """
+        Enqueue the stop sentinel, blocking while the queue is full.
+        """
+        self.queue.put(self._sentinel)
+
+
+def make_log_queue(capacity: int = QUEUE_CAPACITY, processes: bool = False):
+    """
+    Create a bounded queue for the asynchronous logger.
+    Args:
+        capacity (int): Maximum number of pending records.
+        processes (bool): Whether records come from worker processes.
+    Returns:
+        A `queue.Queue`, or a `multiprocessing.Queue` shared by workers.
+    """
+    if processes:
+        return multiprocessing.Queue(capacity)
+    return queue.Queue(capacity)
 
 
-def get_logger() -> logging.Logger:
+def get_logger(
+    asynchronous: bool = False,
+    capacity: int = QUEUE_CAPACITY,
+    block: bool = True,
+    log_queue=None,
+    structured: bool = False,
+    redact: bool = True
+) -> logging.Logger:
     """
     Create and configure a logger for user data.
+    In asynchronous mode the logger only enqueues records; a background
+    listener runs the RedactingFormatter and writes to stderr, and is
+    drained on interpreter exit (see `shutdown_logging`).
+    In structured mode records are written as redacted JSON lines by a
+    JsonRedactingFormatter.
+    Text records whose PII_FIELDS the database already redacted (see
+    `build_query`) can skip the RedactingFormatter with `redact=False`.
+    Args:
+        asynchronous (bool): Hand records to a background listener.
+        capacity (int): Queue capacity when `log_queue` is not given.
+        block (bool): Block when the queue is full instead of dropping.
+        log_queue: Queue to use, e.g. from `make_log_queue(processes=True)`
+            when worker processes log through `get_worker_logger`.
+        structured (bool): Write JSON lines instead of `key=value;` text.
+        redact (bool): Redact text records in the formatter.
     Returns:
         logging.Logger: Configured logger.
     """
     logger = logging.getLogger("user_data")
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    if structured:
+        stream_handler.setFormatter(JsonRedactingFormatter(PII_FIELDS))
+    elif redact:
+        stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    else:
+        stream_handler.setFormatter(
+            logging.Formatter(RedactingFormatter.FORMAT))
+    handler = stream_handler
+    if asynchronous:
+        if log_queue is None:
+            log_queue = make_log_queue(capacity)
+        listener = DrainingQueueListener(log_queue, stream_handler,
+                                         respect_handler_level=True)
+        listener.start()
+        # Registered after the queue exists, so that the listener drains
+        # before multiprocessing tears the queue down at exit.
+        atexit.register(listener.stop)
+        _listeners.append(listener)
+        handler = BoundedQueueHandler(log_queue, block)
+        _handlers.append(handler)
     logger.setLevel(logging.INFO)
     logger.propagate = False
-    logger.addHandler(stream_handler)
+    logger.addHandler(handler)
     return logger
 
 
+def get_worker_logger(log_queue, block: bool = True) -> logging.Logger:
+    """
+    Configure the user data logger of a worker process to forward its
+    records to the listener of the parent process.
+    Args:
+        log_queue: The `multiprocessing.Queue` given to `get_logger`.
+        block (bool): Block when the queue is full instead of dropping.
+    Returns:
+        logging.Logger: Configured logger.
+    """
+    logger = logging.getLogger("user_data")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(BoundedQueueHandler(log_queue, block))
+    return logger
+
+
+def shutdown_logging() -> int:
+    """
+    Stop the asynchronous listeners once every queued record is written.
+    Returns:
+        int: Number of records the queue handlers of this process dropped
+            because their queue was full.
+    """
+    while _listeners:
+        _listeners.pop().stop()
+    dropped = 0
+    while _handlers:
+        dropped += _handlers.pop().dropped
+    return dropped
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """
     Create a connection to the database.
+    `PERSONAL_DATA_DB_DRIVER=sqlite` selects a SQLite stand-in, reading
+    `PERSONAL_DATA_DB_NAME` as the database file, for offline use.
     Returns:
         mysql.connector.connection.MySQLConnection: Database connection.
     """
     db_host = os.getenv("PERSONAL_DATA_DB_HOST", "localhost")
+    db_port = int(os.getenv("PERSONAL_DATA_DB_PORT", "3306"))
     db_name = os.getenv("PERSONAL_DATA_DB_NAME", "")
     db_user = os.getenv("PERSONAL_DATA_DB_USERNAME", "root")
     db_pwd = os.getenv("PERSONAL_DATA_DB_PASSWORD", "")
+    if os.getenv("PERSONAL_DATA_DB_DRIVER", "mysql") == "sqlite":
+        return SQLiteConnection(db_name)
     return mysql.connector.connect(
         host=db_host,
-        port=3306,
+        port=db_port,
         user=db_user,
         password=db_pwd,
         database=db_name
     )
 
 
-def main():
+def get_pool() -> ConnectionPool:
     """
-    Log user records from the database.
+    Return the connection pool of the current process, creating it on
+    first use with `PERSONAL_DATA_DB_POOL_SIZE` connections (default 4).
+    Pools are kept per process id, so forked workers never share the
+    sockets of their parent.
+    Returns:
+        ConnectionPool: Pool of `get_db` connections.
+    """
+    pid = os.getpid()
+    pool = _pools.get(pid)
+    if pool is None:
+        size = int(os.getenv("PERSONAL_DATA_DB_POOL_SIZE", "4"))
+        pool = _pools[pid] = ConnectionPool(get_db, size)
+    return pool
+
+
+def build_query(
+    columns: Sequence[str] = USER_FIELDS,
+    where: Optional[str] = None,
+    order_by: Optional[str] = None,
+    redacted: Sequence[str] = (),
+    limit: Optional[int] = None
+) -> str:
+    """
+    Build the SELECT statement used to export the users table.
+    Columns listed in `redacted` are pushed down to the database as the
+    constant redaction string, so their values never leave it.
+    Args:
+        columns (Sequence[str]): Columns to select, in output order.
+        where (str): Optional WHERE condition, with `%s` placeholders.
+        order_by (str): Optional ORDER BY expression.
+        redacted (Sequence[str]): Columns to replace by the redaction.
+        limit (int): Optional maximum number of rows.
+    Returns:
+        str: The SQL query.
+    """
+    literal = "'{}'".format(RedactingFormatter.REDACTION.replace("'", "''"))
+    select = [
+        "{} AS {}".format(literal, c) if c in redacted else c
+        for c in columns
+    ]
+    query = "SELECT {} FROM users".format(",".join(select))
+    if where:
+        query += " WHERE {}".format(where)
+    if order_by:
+        query += " ORDER BY {}".format(order_by)
+    if limit is not None:
+        query += " LIMIT {:d}".format(limit)
+    return query + ";"
+
+
+def row_template(columns: Sequence[str]) -> str:
+    """
+    Build the format string used to render one row as a log message.
+    Args:
+        columns (Sequence[str]): Column names, in select order.
+    Returns:
+        str: A template such as `name={}; email={};`.
+    """
+    return '{};'.format('; '.join('{}={{}}'.format(c) for c in columns))
+
+
+def stream_rows(
+    connection, query: str, batch_size: int = BATCH_SIZE, params=()
+) -> Iterator[list]:
+    """
+    Run a query on an unbuffered cursor and yield its rows in batches,
+    so that at most `batch_size` rows are held in memory at once.
+    Args:
+        connection: Database connection.
+        query (str): SQL query to run.
+        batch_size (int): Number of rows per `fetchmany` call.
+        params: Query parameters.
+    Yields:
+        list: Batches of row tuples.
+    """
+    with connection.cursor(buffered=False) as cursor:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+
+class ExportStats:
+    """
+    Progress counters of an export run.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Seconds since the export started.
+        """
+        return time.monotonic() - self.started
+
+    def __str__(self) -> str:
+        elapsed = self.elapsed
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        return "exported {} rows in {} batches ({:.0f} rows/s)".format(
+            self.rows, self.batches, rate)
+
+
+def export_users(
+    logger: logging.Logger,
+    connection,
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[ExportStats], None]] = None,
+    pushdown: bool = False
+) -> ExportStats:
+    """
+    Stream the users table through a logger, one record per row.
+    Args:
+        logger (logging.Logger): Logger handling the records.
+        connection: Database connection.
+        batch_size (int): Number of rows fetched per round trip.
+        progress (Callable): Called with the counters after each batch.
+        pushdown (bool): Redact PII_FIELDS in the SELECT itself; the
+            logger then needs no redaction (`get_logger(redact=False)`).
+    Returns:
+        ExportStats: Final counters.
     """
-    fields = "name,email,phone,ssn,password,ip,last_login,user_agent"
-    columns = fields.split(',')
-    query = "SELECT {} FROM users;".format(fields)
-    info_logger = get_logger()
-    connection = get_db()
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
+    query = build_query(redacted=PII_FIELDS if pushdown else ())
+    template = row_template(USER_FIELDS)
+    stats = ExportStats()
+    for rows in stream_rows(connection, query, batch_size):
         for row in rows:
-            record = map(
-                lambda x: '{}={}'.format(x[0], x[1]),
-                zip(columns, row)
+            log_record = logging.LogRecord(
+                logger.name, logging.INFO, None, None,
+                template.format(*row), None, None
             )
-            msg = '{};'.format('; '.join(list(record)))
-            args = ("user_data", logging.INFO, None, None, msg, None, None)
-            log_record = logging.LogRecord(*args)
-            info_logger.handle(log_record)
+            logger.handle(log_record)
+        stats.rows += len(rows)
+        stats.batches += 1
+        if progress is not None:
+            progress(stats)
+    return stats
+
+
+def get_progress_logger() -> logging.Logger:
+    """
+    Create a logger for export progress, kept apart from the
+    `user_data` records.
+    Returns:
+        logging.Logger: Configured logger.
+    """
+    logger = logging.getLogger("user_data_export")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def main():
+    """
+    Log user records from the database.
+    The export is streamed in batches of `PERSONAL_DATA_BATCH_SIZE` rows
+    and progress is reported every `PERSONAL_DATA_PROGRESS_EVERY` batches.
+    Setting `PERSONAL_DATA_LOG_ASYNC=1` moves redaction and output to a
+    background thread, with a `PERSONAL_DATA_LOG_QUEUE_SIZE` queue and a
+    `PERSONAL_DATA_LOG_POLICY` of `block` (default) or `drop`.
+    If the `drop` policy lost records, the final progress line is a
+    warning that counts them.
+    With `PERSONAL_DATA_WORKERS` above 1 the table is instead exported
+    to chunked files by `parallel_export.export_parallel`.
+    `PERSONAL_DATA_PUSHDOWN=1` makes the database return PII_FIELDS
+    already redacted, and the records are no longer scanned for them.
+    `PERSONAL_DATA_INCREMENTAL=1` only exports the rows past the watermark
+    on the `PERSONAL_DATA_WATERMARK` columns saved in
+    `PERSONAL_DATA_STATE_FILE` by the previous run.
+    `PERSONAL_DATA_EXPORT_FORMAT=parquet` (or `arrow`) writes a masked
+    columnar file instead, see `columnar_export`.
+    """
+    batch_size = int(os.getenv("PERSONAL_DATA_BATCH_SIZE", BATCH_SIZE))
+    every = int(os.getenv("PERSONAL_DATA_PROGRESS_EVERY", "10"))
+    workers = int(os.getenv("PERSONAL_DATA_WORKERS", "0"))
+    pushdown = os.getenv("PERSONAL_DATA_PUSHDOWN", "0") == "1"
+    file_format = os.getenv("PERSONAL_DATA_EXPORT_FORMAT")
+    if file_format:
+        from columnar_export import main as columnar_main
+        columnar_main(file_format, batch_size)
+        return
+    if workers > 1:
+        from parallel_export import main as parallel_main
+        parallel_main(workers, batch_size, pushdown)
+        return
+    asynchronous = os.getenv("PERSONAL_DATA_LOG_ASYNC", "0") == "1"
+    capacity = int(os.getenv("PERSONAL_DATA_LOG_QUEUE_SIZE", QUEUE_CAPACITY))
+    block = os.getenv("PERSONAL_DATA_LOG_POLICY", "block") != "drop"
+    progress_logger = get_progress_logger()
+
+    def report(stats: ExportStats) -> None:
+        if every > 0 and stats.batches % every == 0:
+            progress_logger.info(str(stats))
+
+    incremental = os.getenv("PERSONAL_DATA_INCREMENTAL", "0") == "1"
+    dropped = 0
+    info_logger = get_logger(asynchronous, capacity, block,
+                             redact=not pushdown)
+    try:
+        with get_pool().connection() as connection:
+            if incremental:
+                from incremental_export import (
+                    STATE_FILE, WATERMARK, export_incremental
+                )
+                state_path = os.getenv("PERSONAL_DATA_STATE_FILE", STATE_FILE)
+                columns = os.getenv("PERSONAL_DATA_WATERMARK",
+                                    ",".join(WATERMARK)).split(",")
+                stats = export_incremental(info_logger, connection,
+                                           state_path, columns, batch_size,
+                                           report, pushdown)
+            else:
+                stats = export_users(info_logger, connection, batch_size,
+                                     report, pushdown)
+    finally:
+        dropped = shutdown_logging()
+    if dropped:
+        progress_logger.warning("{}, {} of them dropped by the full log "
+                                "queue".format(stats, dropped))
+    else:
+        progress_logger.info(str(stats))
 
 
 class RedactingFormatter(logging.Formatter):
@@ -104,6 +586,7 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         super().__init__(self.FORMAT)
         self.fields = fields
+        self.redactor = Redactor(fields, self.REDACTION, self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -114,7 +597,69 @@ class RedactingFormatter(logging.Formatter):
             str: Formatted and redacted log message.
         """
         msg = super().format(record)
-        return filter_datum(self.fields, self.REDACTION, msg, self.SEPARATOR)
+        return self.redactor.redact(msg)
+
+
+class JsonRedactingFormatter(logging.Formatter):
+    """
+    Formatter writing records as JSON lines, with PII keys masked in the
+    structured payload itself rather than in formatted text.
+    The payload is the record message when it is a dict, merged with the
+    `extra` attributes of the record; a text message is still redacted.
+    """
+    REDACTION = RedactingFormatter.REDACTION
+    SEPARATOR = RedactingFormatter.SEPARATOR
+
+    # Attributes every LogRecord has, which are not part of `extra`
+    RESERVED = frozenset(
+        logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+    ) | {"message", "asctime"}
+
+    def __init__(self, fields: List[str]):
+        super().__init__()
+        self.fields = frozenset(fields)
+        self.redactor = Redactor(fields, self.REDACTION, self.SEPARATOR)
+
+    def payload(self, record: logging.LogRecord) -> dict:
+        """
+        Collect the structured data of a record: a dict message and the
+        `extra` attributes.
+        Args:
+            record (logging.LogRecord): Log record.
+        Returns:
+            dict: The payload, not yet redacted.
+        """
+        data = {}
+        if isinstance(record.msg, dict):
+            data.update(record.msg)
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED:
+                data[key] = value
+        return data
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format the log record as one JSON line, redacting sensitive keys.
+        Args:
+            record (logging.LogRecord): Log record.
+        Returns:
+            str: JSON object with time, name, level, message and data.
+        """
+        entry = {
+            "time": self.formatTime(record),
+            "name": record.name,
+            "level": record.levelname,
+        }
+        if not isinstance(record.msg, dict):
+            entry["message"] = self.redactor.redact(record.getMessage())
+        data = self.payload(record)
+        if data:
+            entry["data"] = redact_mapping(data, self.fields, self.REDACTION)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_text"] = self.redactor.redact(record.exc_text)
+        return json.dumps(entry, default=str)
 
 
 if __name__ == "__main__":
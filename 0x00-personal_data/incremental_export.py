@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+This module exports only the users changed since the previous run.
+A high-water mark over the watermark columns is kept in a local state
+file, and rows past it are read with keyset pagination.
+"""
+import os
+import json
+import logging
+from typing import Callable, Optional, Sequence, Tuple
+
+from filtered_logger import (
+    BATCH_SIZE, PII_FIELDS, USER_FIELDS, ExportStats, build_query,
+    row_template
+)
+
+# Columns ordering the export; together they must be unique per row,
+# so that no row is skipped between two pages. The primary key breaks
+# ties on `last_login`: the watermark is saved in plaintext, so it must
+# not hold PII
+WATERMARK = ("last_login", "id")
+
+# Default location of the watermark state file
+STATE_FILE = ".export_state.json"
+
+
+def load_watermark(path: str, columns: Sequence[str]) -> Optional[list]:
+    """
+    Read the last exported watermark values.
+    Args:
+        path (str): State file.
+        columns (Sequence[str]): Expected watermark columns.
+    Returns:
+        Optional[list]: Values of the columns, or None on the first run.
+    Raises:
+        ValueError: If the state was saved for other columns.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        state = json.load(f)
+    if state.get("columns") != list(columns):
+        raise ValueError("{} tracks {}, not {}".format(
+            path, state.get("columns"), list(columns)))
+    return state.get("values")
+
+
+def save_watermark(path: str, columns: Sequence[str], values) -> None:
+    """
+    Atomically replace the state file with new watermark values.
+    Args:
+        path (str): State file.
+        columns (Sequence[str]): Watermark columns.
+        values: Values of the columns for the last exported row.
+    """
+    values = [
+        v if v is None or isinstance(v, (int, float, str)) else str(v)
+        for v in values
+    ]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"columns": list(columns), "values": values}, f)
+    os.replace(tmp_path, path)
+
+
+def keyset_condition(
+    columns: Sequence[str], values: Sequence
+) -> Tuple[str, tuple]:
+    """
+    Build the condition selecting rows strictly after `values` in
+    `columns` order, expanded so that the database can seek an index:
+    `a > %s OR (a = %s AND b > %s)`.
+    Args:
+        columns (Sequence[str]): Watermark columns, table-qualified.
+        values (Sequence): Watermark values.
+    Returns:
+        Tuple[str, tuple]: The condition and its parameters.
+    """
+    terms = []
+    params = []
+    for i, column in enumerate(columns):
+        parts = ["{} = %s".format(c) for c in columns[:i]]
+        parts.append("{} > %s".format(column))
+        terms.append("({})".format(" AND ".join(parts)))
+        params.extend(values[:i + 1])
+    return " OR ".join(terms), tuple(params)
+
+
+def export_incremental(
+    logger: logging.Logger,
+    connection,
+    state_path: str = STATE_FILE,
+    columns: Sequence[str] = WATERMARK,
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[ExportStats], None]] = None,
+    pushdown: bool = False
+) -> ExportStats:
+    """
+    Log the users past the saved watermark, one page of `batch_size`
+    rows at a time, saving the watermark after each page. A run that
+    stops half-way resumes after the last saved page.
+    Rows whose watermark columns are NULL are never exported.
+    Args:
+        logger (logging.Logger): Logger handling the records.
+        connection: Database connection.
+        state_path (str): Watermark state file.
+        columns (Sequence[str]): Watermark columns.
+        batch_size (int): Number of rows per page.
+        progress (Callable): Called with the counters after each page.
+        pushdown (bool): Redact PII_FIELDS in the SELECT itself.
+    Returns:
+        ExportStats: Final counters.
+    """
+    last = load_watermark(state_path, columns)
+    template = row_template(USER_FIELDS)
+    width = len(USER_FIELDS)
+    # Pushed-down redaction selects `'***' AS email`, and ORDER BY binds a
+    # bare `email` to that alias: the watermark columns are qualified with
+    # the table wherever they are used, and selected again under their
+    # own alias, so they stay raw.
+    qualified = ["users.{}".format(c) for c in columns]
+    select = list(USER_FIELDS) + [
+        "{} AS watermark_{}".format(c, i) for i, c in enumerate(qualified)
+    ]
+    redacted = PII_FIELDS if pushdown else ()
+    stats = ExportStats()
+    while True:
+        if last is None:
+            where = " AND ".join(
+                "{} IS NOT NULL".format(c) for c in qualified)
+            params = ()
+        else:
+            where, params = keyset_condition(qualified, last)
+        query = build_query(select, where, ", ".join(qualified), redacted,
+                            batch_size)
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        for row in rows:
+            log_record = logging.LogRecord(
+                logger.name, logging.INFO, None, None,
+                template.format(*row[:width]), None, None
+            )
+            logger.handle(log_record)
+        if rows:
+            last = list(rows[-1][width:])
+            save_watermark(state_path, columns, last)
+            stats.rows += len(rows)
+            stats.batches += 1
+            if progress is not None:
+                progress(stats)
+        if len(rows) < batch_size:
+            return stats
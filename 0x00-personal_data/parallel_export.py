@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+This module exports the users table in parallel.
+The table is split into ranges of a key column, each range is redacted
+by its own worker process into part files, and the parts are merged in
+key order into files of CHUNK_ROWS lines.
+"""
+import os
+import glob
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from filtered_logger import (
+    BATCH_SIZE, PII_FIELDS, USER_FIELDS, RedactingFormatter, build_query,
+    get_pool, get_progress_logger, row_template, stream_rows
+)
+
+# Column used to split the table into ranges
+SPLIT_KEY = "last_login"
+
+# Maximum number of lines per output file
+CHUNK_ROWS = 100000
+
+# Name of the final output files, numbered in key order
+CHUNK_NAME = "users-{:05d}.log"
+CHUNK_GLOB = "users-*.log"
+
+# Name of the temporary files of each range, renamed once all are done
+PART_NAME = ".part-{:04d}-{:04d}"
+PART_GLOB = ".part-*"
+
+# Key types whose bounds are interpolated between the minimum and maximum
+INTERPOLATED = (int, float, Decimal, date, datetime, timedelta)
+
+
+def key_ranges(connection, key: str, parts: int) -> List[Tuple[str, tuple]]:
+    """
+    Split the users table into ranges of `key`, in ascending key order.
+    Numeric and date/time keys are cut into `parts` equal intervals.
+    Keys of other types, such as strings, cannot be interpolated: they are
+    cut at the values found at every `1/parts` of the rows in key order.
+    Rows whose key is NULL get a range of their own, first, as in
+    `ORDER BY key`.
+    Args:
+        connection: Database connection.
+        key (str): Column to split on.
+        parts (int): Number of ranges wanted.
+    Returns:
+        List[Tuple[str, tuple]]: WHERE conditions and their parameters.
+    """
+    query = "SELECT MIN({0}), MAX({0}) FROM users;".format(key)
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        low, high = cursor.fetchone()
+    ranges = [("{} IS NULL".format(key), ())]
+    if low is None:
+        return ranges
+    if low == high:
+        bounds = [low]
+    elif isinstance(low, int):
+        bounds = [low + (high - low) * i // parts for i in range(parts)]
+    elif isinstance(low, INTERPOLATED):
+        step = (high - low) / parts
+        bounds = [low + step * i for i in range(parts)]
+    else:
+        bounds = quantile_bounds(connection, key, parts)
+    bounds = sorted(set(bounds))
+    for start, end in zip(bounds, bounds[1:]):
+        ranges.append(("{0} >= %s AND {0} < %s".format(key), (start, end)))
+    ranges.append(("{0} >= %s AND {0} <= %s".format(key), (bounds[-1], high)))
+    return ranges
+
+
+def quantile_bounds(connection, key: str, parts: int) -> list:
+    """
+    Read the lower bounds of `parts` ranges holding as many rows each,
+    for keys whose values cannot be interpolated.
+    Args:
+        connection: Database connection.
+        key (str): Column to split on.
+        parts (int): Number of ranges wanted.
+    Returns:
+        list: The key values at every `1/parts` of the non-NULL rows.
+    """
+    query = ("SELECT {0} FROM users WHERE {0} IS NOT NULL "
+             "ORDER BY {0} LIMIT 1 OFFSET %s;".format(key))
+    bounds = []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT({}) FROM users;".format(key))
+        count = cursor.fetchone()[0]
+        for i in range(parts):
+            cursor.execute(query, (count * i // parts,))
+            bounds.append(cursor.fetchone()[0])
+    return bounds
+
+
+def export_range(
+    index: int, where: str, params: tuple, key: str, out_dir: str,
+    chunk_rows: int = CHUNK_ROWS, batch_size: int = BATCH_SIZE,
+    pushdown: bool = False
+) -> Tuple[int, List[str]]:
+    """
+    Export one key range to temporary chunk files.
+    Runs in a worker process, with its own connection pool and formatter.
+    With `pushdown` the rows arrive redacted, so the formatter does not
+    redact them again.
+    Args:
+        index (int): Position of the range in key order.
+        where (str): WHERE condition selecting the range.
+        params (tuple): Parameters of the condition.
+        key (str): Column the range is ordered by.
+        out_dir (str): Directory receiving the files.
+        chunk_rows (int): Maximum number of lines per file.
+        batch_size (int): Number of rows fetched per round trip.
+        pushdown (bool): Redact PII_FIELDS in the SELECT itself.
+    Returns:
+        Tuple[int, List[str]]: Rows written and the files, in order.
+    """
+    if pushdown:
+        formatter = logging.Formatter(RedactingFormatter.FORMAT)
+    else:
+        formatter = RedactingFormatter(PII_FIELDS)
+    template = row_template(USER_FIELDS)
+    query = build_query(where=where, order_by=key,
+                        redacted=PII_FIELDS if pushdown else ())
+    paths = []
+    rows_written = 0
+    out = None
+    try:
+        with get_pool().connection() as connection:
+            for rows in stream_rows(connection, query, batch_size, params):
+                for row in rows:
+                    if rows_written % chunk_rows == 0:
+                        if out is not None:
+                            out.close()
+                        paths.append(os.path.join(
+                            out_dir, PART_NAME.format(index, len(paths))))
+                        out = open(paths[-1], "w")
+                    record = logging.LogRecord(
+                        "user_data", logging.INFO, None, None,
+                        template.format(*row), None, None
+                    )
+                    out.write(formatter.format(record) + "\n")
+                    rows_written += 1
+    finally:
+        if out is not None:
+            out.close()
+    return rows_written, paths
+
+
+def export_parallel(
+    workers: int, key: str = SPLIT_KEY, out_dir: str = "export",
+    chunk_rows: int = CHUNK_ROWS, batch_size: int = BATCH_SIZE,
+    pushdown: bool = False
+) -> Tuple[int, List[str]]:
+    """
+    Export the users table with one process per key range.
+    Args:
+        workers (int): Number of worker processes (and of key ranges).
+        key (str): Column to split and order on.
+        out_dir (str): Directory receiving the chunk files.
+        chunk_rows (int): Maximum number of lines per file.
+        batch_size (int): Number of rows fetched per round trip.
+        pushdown (bool): Redact PII_FIELDS in the SELECT itself.
+    Returns:
+        Tuple[int, List[str]]: Total rows and the final files, in order.
+    """
+    progress_logger = get_progress_logger()
+    os.makedirs(out_dir, exist_ok=True)
+    # Parts left by an interrupted run would be renamed with these ones
+    for stale in glob.glob(os.path.join(out_dir, PART_GLOB)):
+        os.remove(stale)
+    with get_pool().connection() as connection:
+        ranges = key_ranges(connection, key, workers)
+
+    total = 0
+    parts = []
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(export_range, index, where, params, key,
+                            out_dir, chunk_rows, batch_size, pushdown)
+            for index, (where, params) in enumerate(ranges)
+        ]
+        for index, future in enumerate(futures):
+            rows, paths = future.result()
+            total += rows
+            for number, path in enumerate(paths):
+                parts.append((path, min(chunk_rows,
+                                        rows - number * chunk_rows)))
+            progress_logger.info("range {}/{} done: {} rows".format(
+                index + 1, len(ranges), rows))
+
+    for stale in glob.glob(os.path.join(out_dir, CHUNK_GLOB)):
+        os.remove(stale)
+    return total, merge_parts(parts, out_dir, chunk_rows)
+
+
+def merge_parts(parts: List[Tuple[str, int]], out_dir: str,
+                chunk_rows: int = CHUNK_ROWS) -> List[str]:
+    """
+    Concatenate part files in order into numbered files of `chunk_rows`
+    lines, the last one possibly shorter, removing the parts.
+    A full part that starts a file is renamed rather than copied.
+    Args:
+        parts (List[Tuple[str, int]]): Part files and their line counts.
+        out_dir (str): Directory receiving the files.
+        chunk_rows (int): Number of lines per file.
+    Returns:
+        List[str]: The files, in order.
+    """
+    files = []
+    out = None
+    written = 0
+    try:
+        for part, lines in parts:
+            if out is None and lines == chunk_rows:
+                files.append(os.path.join(out_dir,
+                                          CHUNK_NAME.format(len(files))))
+                os.replace(part, files[-1])
+                continue
+            with open(part, "r") as f:
+                for line in f:
+                    if out is None:
+                        files.append(os.path.join(
+                            out_dir, CHUNK_NAME.format(len(files))))
+                        out = open(files[-1], "w")
+                    out.write(line)
+                    written += 1
+                    if written == chunk_rows:
+                        out.close()
+                        out = None
+                        written = 0
+            os.remove(part)
+    finally:
+        if out is not None:
+            out.close()
+    return files
+
+
+def main(workers: int, batch_size: int = BATCH_SIZE,
+         pushdown: bool = False) -> None:
+    """
+    Run the parallel export configured by `PERSONAL_DATA_SPLIT_KEY`,
+    `PERSONAL_DATA_EXPORT_DIR` and `PERSONAL_DATA_CHUNK_ROWS`.
+    Args:
+        workers (int): Number of worker processes.
+        batch_size (int): Number of rows fetched per round trip.
+        pushdown (bool): Redact PII_FIELDS in the SELECT itself.
+    """
+    key = os.getenv("PERSONAL_DATA_SPLIT_KEY", SPLIT_KEY)
+    out_dir = os.getenv("PERSONAL_DATA_EXPORT_DIR", "export")
+    chunk_rows = int(os.getenv("PERSONAL_DATA_CHUNK_ROWS", CHUNK_ROWS))
+    total, files = export_parallel(workers, key, out_dir, chunk_rows,
+                                   batch_size, pushdown)
+    get_progress_logger().info("exported {} rows to {} files in {}".format(
+        total, len(files), out_dir))
+
+
+if __name__ == "__main__":
+    main(int(os.getenv("PERSONAL_DATA_WORKERS", os.cpu_count() or 1)),
+         int(os.getenv("PERSONAL_DATA_BATCH_SIZE", BATCH_SIZE)),
+         os.getenv("PERSONAL_DATA_PUSHDOWN", "0") == "1")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests of the columnar export, on the SQLite stand-in database.
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import pyarrow.ipc
+import pyarrow.parquet
+
+from columnar_export import export_columnar
+from db_pool import SQLiteConnection
+from filtered_logger import PII_FIELDS
+
+
+class TestExportColumnar(unittest.TestCase):
+    """
+    PII masking of `export_columnar`, with and without pushdown.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database = os.path.join(self.tmp.name, "users.db")
+        self.connection = SQLiteConnection(database)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE users (name TEXT, email TEXT, phone INTEGER, "
+                "ssn TEXT, password BLOB, ip TEXT, last_login TIMESTAMP, "
+                "user_agent TEXT)")
+            for i in range(5):
+                cursor.execute(
+                    "INSERT INTO users VALUES "
+                    "(%s, %s, %s, %s, %s, %s, %s, %s)",
+                    ("user{}".format(i), None, 5550100 + i, None,
+                     b"\x00hash", "10.0.0.{}".format(i),
+                     "2024-01-0{} 12:00:00".format(i + 1), "Mozilla"))
+        self.connection.commit()
+
+    def tearDown(self):
+        self.connection.close()
+        self.tmp.cleanup()
+
+    def export(self, file_format: str, pushdown: bool) -> dict:
+        """
+        Export the users in batches of 2 and return the file's columns.
+        """
+        path = os.path.join(self.tmp.name, "users." + file_format)
+        stats = export_columnar(self.connection, path, file_format,
+                                batch_size=2, pushdown=pushdown)
+        self.assertEqual((stats.rows, stats.batches), (5, 3))
+        if file_format == "parquet":
+            table = pyarrow.parquet.read_table(path)
+        else:
+            with pyarrow.ipc.open_file(path) as reader:
+                table = reader.read_all()
+        return table.to_pydict()
+
+    def check(self, columns: dict) -> None:
+        """
+        Check that PII columns are masked and the others kept.
+        """
+        for field in PII_FIELDS:
+            self.assertEqual(columns[field], ["***"] * 5)
+        self.assertEqual(columns["ip"],
+                         ["10.0.0.{}".format(i) for i in range(5)])
+        self.assertEqual(columns["last_login"],
+                         [datetime(2024, 1, i + 1, 12) for i in range(5)])
+
+    def test_pushdown(self):
+        """ PII redacted by the SELECT """
+        self.check(self.export("parquet", True))
+        self.check(self.export("arrow", True))
+
+    def test_without_pushdown(self):
+        """ Fetched PII of any type, or NULL, is masked """
+        self.check(self.export("parquet", False))
+        self.check(self.export("arrow", False))
+
+
+if __name__ == "__main__":
+    unittest.main()
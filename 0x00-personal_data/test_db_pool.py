@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests of the connection pool, on the SQLite stand-in database.
+"""
+import threading
+import time
+import unittest
+
+from db_pool import ConnectionPool, SQLiteConnection
+
+
+class BrokenConnection(SQLiteConnection):
+    """
+    Connection whose health check fails with an error.
+    """
+
+    def is_connected(self) -> bool:
+        raise OSError("Lost connection to MySQL server")
+
+
+class TestConnectionPool(unittest.TestCase):
+    """
+    Borrowing, reuse and health checks of `ConnectionPool`.
+    """
+
+    def setUp(self):
+        self.opened = []
+        self.factory = SQLiteConnection
+
+    def connect(self) -> SQLiteConnection:
+        """
+        Open a connection, keeping track of it.
+        """
+        connection = self.factory("")
+        self.opened.append(connection)
+        return connection
+
+    def test_acquire_release(self):
+        """ A released connection is reused instead of opening another """
+        pool = ConnectionPool(self.connect, size=2)
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_lifo(self):
+        """ The most recently released connection is handed out first """
+        pool = ConnectionPool(self.connect, size=2)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        self.assertIs(pool.acquire(), second)
+        self.assertIs(pool.acquire(), first)
+
+    def test_closed_connection(self):
+        """ An idle connection closed meanwhile is replaced """
+        pool = ConnectionPool(self.connect, size=1)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.close()
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(replacement.is_connected())
+
+    def test_broken_connection(self):
+        """ A connection whose health check raises is closed, not reused """
+        self.factory = BrokenConnection
+        pool = ConnectionPool(self.connect, size=1)
+        pool.release(pool.acquire())
+        self.factory = SQLiteConnection
+        connection = pool.acquire()
+        self.assertIsNot(connection, self.opened[0])
+        self.assertEqual(len(self.opened), 2)
+
+    def test_discard_on_error(self):
+        """ A connection used by a failed block is closed, not reused """
+        pool = ConnectionPool(self.connect, size=1)
+        with self.assertRaises(ValueError):
+            with pool.connection() as connection:
+                raise ValueError("query failed")
+        self.assertFalse(connection.is_connected())
+        self.assertIsNot(pool.acquire(), connection)
+
+    def test_timeout(self):
+        """ Acquiring from an exhausted pool times out """
+        pool = ConnectionPool(self.connect, size=1, timeout=0.05)
+        pool.acquire()
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            pool.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_wait_for_release(self):
+        """ Acquiring from an exhausted pool waits for a release """
+        pool = ConnectionPool(self.connect, size=1, timeout=5)
+        connection = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (connection,))
+        timer.start()
+        self.assertIs(pool.acquire(), connection)
+        timer.join()
+
+    def test_close(self):
+        """ Closing the pool closes idle and then released connections """
+        pool = ConnectionPool(self.connect, size=2)
+        idle, borrowed = pool.acquire(), pool.acquire()
+        pool.release(idle)
+        pool.close()
+        self.assertFalse(idle.is_connected())
+        self.assertTrue(borrowed.is_connected())
+        pool.release(borrowed)
+        self.assertFalse(borrowed.is_connected())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests of the bcrypt cost settings and of the rehash on verify.
+"""
+import unittest
+
+from encrypt_password import (
+    cost_of, get_rounds, hash_password, set_rounds, verify_and_rehash
+)
+
+
+class TestSetRounds(unittest.TestCase):
+    """
+    Validation of the bcrypt cost.
+    """
+
+    def setUp(self):
+        self.rounds = get_rounds()
+
+    def tearDown(self):
+        set_rounds(self.rounds)
+
+    def test_valid(self):
+        """ Integers and decimal strings in range are accepted """
+        set_rounds(5)
+        self.assertEqual(get_rounds(), 5)
+        set_rounds("6")
+        self.assertEqual(get_rounds(), 6)
+
+    def test_invalid(self):
+        """ Other values raise a ValueError and keep the cost """
+        for rounds in (3, 32, "abc", "", "12.5", 12.0, True, None):
+            with self.assertRaises(ValueError):
+                set_rounds(rounds)
+        self.assertEqual(get_rounds(), self.rounds)
+
+
+class TestVerifyAndRehash(unittest.TestCase):
+    """
+    Rehash on verify when the stored cost is not the current one.
+    """
+
+    def setUp(self):
+        self.rounds = get_rounds()
+        set_rounds(4)
+        self.stored = hash_password("secret", 5)
+
+    def tearDown(self):
+        set_rounds(self.rounds)
+
+    def test_rehash(self):
+        """ A valid password is rehashed at the current cost, once """
+        valid, rehashed = verify_and_rehash(self.stored, "secret")
+        self.assertTrue(valid)
+        self.assertEqual(cost_of(rehashed), 4)
+        self.assertEqual(verify_and_rehash(rehashed, "secret"), (True, None))
+
+    def test_wrong_password(self):
+        """ A wrong password is not rehashed """
+        self.assertEqual(verify_and_rehash(self.stored, "wrong"),
+                         (False, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests of the users export with redaction pushed down to the database.
+"""
+import io
+import logging
+import re
+import unittest
+
+from db_pool import SQLiteConnection
+from filtered_logger import PII_FIELDS, RedactingFormatter, export_users
+
+
+class TestExportPushdown(unittest.TestCase):
+    """
+    `export_users` with `pushdown` against the default export.
+    """
+
+    def setUp(self):
+        self.connection = SQLiteConnection("")
+        self.connection._connection.execute(
+            "CREATE TABLE users (name TEXT, email TEXT, phone TEXT, "
+            "ssn TEXT, password TEXT, ip TEXT, last_login TEXT, "
+            "user_agent TEXT)")
+
+    def tearDown(self):
+        self.connection.close()
+
+    def insert(self, name: str) -> None:
+        """
+        Add a user with the given name.
+        """
+        self.connection._connection.execute(
+            "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, "bob@example.com", "555-0100", "123-45-6789", "hash",
+             "10.0.0.1", "2024-01-01 00:00:00", "Mozilla/5.0"))
+
+    def export(self, pushdown: bool) -> list:
+        """
+        Export the users as `main` does and return the messages, without
+        the record prefix.
+        """
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        if pushdown:
+            handler.setFormatter(logging.Formatter(RedactingFormatter.FORMAT))
+        else:
+            handler.setFormatter(RedactingFormatter(PII_FIELDS))
+        logger = logging.Logger("user_data")
+        logger.addHandler(handler)
+        export_users(logger, self.connection, pushdown=pushdown)
+        return [re.sub(r"^\[HOLBERTON\] user_data INFO .*?: ", "", line)
+                for line in stream.getvalue().splitlines()]
+
+    def test_same_output(self):
+        """ Plain values give the same lines as the default export """
+        self.insert("Bob")
+        lines = self.export(True)
+        self.assertEqual(lines, self.export(False))
+        self.assertEqual(
+            lines[0], "name=***; email=***; phone=***; ssn=***; "
+            "password=***; ip=10.0.0.1; last_login=2024-01-01 00:00:00; "
+            "user_agent=Mozilla/5.0;")
+
+    def test_separator_in_value(self):
+        """ No part of a PII value holding the separator is written """
+        self.insert("Bob; Jr")
+        lines = self.export(True)
+        self.assertTrue(lines[0].startswith("name=***; email=***;"))
+        self.assertNotIn("Jr", lines[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
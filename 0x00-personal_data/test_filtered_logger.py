@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests of the asynchronous mode of the user data logger.
+"""
+import io
+import logging
+import unittest
+from unittest import mock
+
+from filtered_logger import get_logger, shutdown_logging
+
+
+class TestAsynchronousLogger(unittest.TestCase):
+    """
+    Records dropped by `get_logger(asynchronous=True, block=False)`.
+    """
+
+    def tearDown(self):
+        shutdown_logging()
+        logger = logging.getLogger("user_data")
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+
+    def log(self, count: int, capacity: int, block: bool) -> tuple:
+        """
+        Log `count` records and return the number of lines written and
+        the number of records `shutdown_logging` reports as dropped.
+        """
+        stderr = io.StringIO()
+        with mock.patch("sys.stderr", stderr):
+            logger = get_logger(True, capacity, block)
+        for i in range(count):
+            logger.info("name=user%d; ip=10.0.0.1;", i)
+        dropped = shutdown_logging()
+        return len(stderr.getvalue().splitlines()), dropped
+
+    def test_drop_policy(self):
+        """ Every record is either written or reported as dropped """
+        written, dropped = self.log(1000, 1, False)
+        self.assertGreater(dropped, 0)
+        self.assertEqual(written + dropped, 1000)
+        self.assertEqual(shutdown_logging(), 0)
+
+    def test_block_policy(self):
+        """ A blocking queue writes every record and drops none """
+        self.assertEqual(self.log(1000, 1, True), (1000, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
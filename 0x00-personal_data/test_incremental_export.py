@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests of the incremental export, on the SQLite stand-in database.
+"""
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from db_pool import SQLiteConnection
+from incremental_export import export_incremental
+
+
+class ListHandler(logging.Handler):
+    """
+    Handler keeping the messages of the records it receives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+class TestExportIncremental(unittest.TestCase):
+    """
+    Keyset pagination of `export_incremental`.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp.name, "state.json")
+        self.connection = SQLiteConnection("")
+        self.connection._connection.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+            "email TEXT, phone TEXT, ssn TEXT, password TEXT, ip TEXT, "
+            "last_login TEXT, user_agent TEXT)")
+        self.handler = ListHandler()
+        self.logger = logging.Logger("user_data")
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.connection.close()
+        self.tmp.cleanup()
+
+    def insert(self, count: int, last_login: str) -> None:
+        """
+        Add users sharing one `last_login`, whose emails sort in the
+        reverse order of their ids.
+        """
+        start = self.connection._connection.execute(
+            "SELECT COUNT(*) FROM users").fetchone()[0]
+        self.connection._connection.executemany(
+            "INSERT INTO users (ip, email, last_login) VALUES (?, ?, ?)",
+            [("10.0.0.{}".format(i), "{:03d}@example.com".format(999 - i),
+              last_login) for i in range(start, start + count)])
+
+    def export(self) -> list:
+        """
+        Run one incremental export and return the ips it logged.
+        """
+        del self.handler.messages[:]
+        export_incremental(self.logger, self.connection, self.state_path,
+                           batch_size=4, pushdown=True)
+        return [message.split("; ")[5] for message in self.handler.messages]
+
+    def test_rows_sharing_last_login(self):
+        """ Every row is exported once, however many share a watermark """
+        self.insert(25, "2024-01-01 00:00:00")
+        ips = self.export()
+        self.assertEqual(len(ips), 25)
+        self.assertEqual(len(set(ips)), 25)
+        self.assertEqual(self.export(), [])
+
+        self.insert(6, "2024-01-01 00:00:00")
+        self.insert(3, "2024-01-02 00:00:00")
+        ips = self.export()
+        self.assertEqual(len(ips), 9)
+        self.assertEqual(len(set(ips)), 9)
+
+    def test_watermark_holds_no_pii(self):
+        """ The state file keeps the last login and id, not the email """
+        self.insert(5, "2024-01-01 00:00:00")
+        self.export()
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.assertEqual(state["columns"], ["last_login", "id"])
+        self.assertEqual(state["values"], ["2024-01-01 00:00:00", 5])
+        self.assertNotIn("example.com", json.dumps(state))
+
+
+if __name__ == "__main__":
+    unittest.main()
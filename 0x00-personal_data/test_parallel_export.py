@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Tests of the parallel export, on the SQLite stand-in database.
+"""
+import glob
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import filtered_logger
+from db_pool import SQLiteConnection
+from parallel_export import export_parallel, key_ranges, merge_parts
+
+
+class TestKeyRanges(unittest.TestCase):
+    """
+    Splitting of the users table by `key_ranges`.
+    """
+
+    def setUp(self):
+        self.connection = SQLiteConnection("")
+        self.connection._connection.execute(
+            "CREATE TABLE users (id INTEGER, last_login TEXT)")
+
+    def tearDown(self):
+        self.connection.close()
+
+    def insert(self, rows: list) -> None:
+        """
+        Add (id, last_login) users.
+        """
+        self.connection._connection.executemany(
+            "INSERT INTO users VALUES (?, ?)", rows)
+
+    def split(self, key: str, parts: int) -> list:
+        """
+        Return the number of rows in each range of `key`.
+        """
+        counts = []
+        with self.connection.cursor() as cursor:
+            for where, params in key_ranges(self.connection, key, parts):
+                cursor.execute(
+                    "SELECT COUNT(*) FROM users WHERE {}".format(where),
+                    params)
+                counts.append(cursor.fetchone()[0])
+        return counts
+
+    def test_integer_key(self):
+        """ Integer keys are cut into equal intervals """
+        self.insert([(i, None) for i in range(100)])
+        self.assertEqual(self.split("id", 4), [0, 24, 25, 25, 26])
+
+    def test_string_key(self):
+        """ String keys are cut at quantiles instead of a single range """
+        self.insert([(i, "2024-01-{:02d} 00:00:00".format(i % 28 + 1))
+                     for i in range(280)] + [(280, None)])
+        counts = self.split("last_login", 4)
+        self.assertEqual(len(counts), 5)
+        self.assertEqual(counts[0], 1)
+        self.assertEqual(sum(counts), 281)
+        for count in counts[1:]:
+            self.assertAlmostEqual(count, 70, delta=10)
+
+    def test_single_value(self):
+        """ A key with one value gives one range """
+        self.insert([(1, "x"), (2, "x")])
+        self.assertEqual(self.split("last_login", 4), [0, 2])
+
+
+class TestMergeParts(unittest.TestCase):
+    """
+    Layout of the files written by the parallel export.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_part(self, name: str, lines: list) -> tuple:
+        """
+        Write a part file and return it with its line count.
+        """
+        path = os.path.join(self.out_dir, name)
+        with open(path, "w") as f:
+            f.writelines(line + "\n" for line in lines)
+        return path, len(lines)
+
+    def read(self, files: list) -> list:
+        """
+        Return the lines of each file.
+        """
+        contents = []
+        for path in files:
+            with open(path) as f:
+                contents.append(f.read().splitlines())
+        return contents
+
+    def test_merge_parts(self):
+        """ Parts are concatenated in order into files of chunk_rows lines """
+        lines = ["row{}".format(i) for i in range(11)]
+        parts = [self.write_part(".part-0000-0000", lines[:3]),
+                 self.write_part(".part-0000-0001", lines[3:4]),
+                 self.write_part(".part-0001-0000", lines[4:7]),
+                 self.write_part(".part-0002-0000", lines[7:9]),
+                 self.write_part(".part-0003-0000", lines[9:])]
+        files = merge_parts(parts, self.out_dir, 3)
+        self.assertEqual([os.path.basename(f) for f in files],
+                         ["users-00000.log", "users-00001.log",
+                          "users-00002.log", "users-00003.log"])
+        self.assertEqual(self.read(files),
+                         [lines[:3], lines[3:6], lines[6:9], lines[9:]])
+        self.assertEqual(glob.glob(os.path.join(self.out_dir, ".part-*")),
+                         [])
+
+    def test_export_parallel(self):
+        """ Only the last file is short, and stale parts are ignored """
+        database = os.path.join(self.out_dir, "users.db")
+        connection = sqlite3.connect(database)
+        connection.execute(
+            "CREATE TABLE users (name TEXT, email TEXT, phone TEXT, "
+            "ssn TEXT, password TEXT, ip TEXT, last_login TEXT, "
+            "user_agent TEXT)")
+        connection.executemany(
+            "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [("n", "e", "p", "s", "pw", "10.0.0.1",
+              "2024-01-01 00:{:02d}:{:02d}".format(i // 60, i % 60), "ua")
+             for i in range(250)])
+        connection.commit()
+        connection.close()
+        out_dir = os.path.join(self.out_dir, "export")
+        os.makedirs(out_dir)
+        self.write_part(os.path.join("export", ".part-0009-0000"),
+                        ["stale"])
+        env = {"PERSONAL_DATA_DB_DRIVER": "sqlite",
+               "PERSONAL_DATA_DB_NAME": database}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch.dict(filtered_logger._pools, clear=True):
+            total, files = export_parallel(3, out_dir=out_dir,
+                                           chunk_rows=40)
+        self.assertEqual(total, 250)
+        contents = self.read(files)
+        self.assertEqual([len(lines) for lines in contents],
+                         [40] * 6 + [10])
+        logins = [line.split("last_login=")[1][:19]
+                  for lines in contents for line in lines]
+        self.assertEqual(logins, sorted(logins))
+        self.assertEqual(sorted(os.listdir(out_dir)),
+                         [os.path.basename(f) for f in files])
+
+
+if __name__ == "__main__":
+    unittest.main()
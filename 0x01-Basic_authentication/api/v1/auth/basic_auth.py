@@ -75,8 +75,7 @@ class BasicAuth(Auth):
 
         from models.user import User
         try:
-            users = User.search({'email': user_email})
-            for user in users:
+            for user in User.iter_search({'email': user_email}):
                 if user.is_valid_password(user_pwd):
                     return user
         except Exception:
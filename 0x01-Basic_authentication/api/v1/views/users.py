@@ -2,18 +2,132 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import (
+    Response, abort, json, jsonify, request, stream_with_context
+)
 from models.user import User
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlencode
+import hashlib
+import zlib
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Users serialized per chunk of a streamed listing
+STREAM_CHUNK_SIZE = 1000
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of users, up to MAX_PAGE_SIZE
+      - cursor: X-Next-Cursor header of the previous page
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, streamed in ID
+        order and gzipped if the client accepts it, or
+        one page of them in ID order when limit or cursor is given,
+        with the cursor of the next page in the X-Next-Cursor header
+        and a `next` Link header
+      - 304 if the ETag in If-None-Match is current: it changes with
+        every change of the users
+      - 400 if limit is not a positive integer
+    """
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        gzipped = request.accept_encodings['gzip'] > 0
+        etag = _etag("users", User.version(), gzipped)
+        response = _not_modified(etag)
+        if response is not None:
+            return response
+        body = _json_array(User.iterate(STREAM_CHUNK_SIZE))
+        headers = {'Vary': 'Accept-Encoding'}
+        if gzipped:
+            body = _gzip(body)
+            headers['Content-Encoding'] = 'gzip'
+        response = Response(stream_with_context(body),
+                            mimetype='application/json', headers=headers)
+        response.set_etag(etag)
+        return response
+
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)),
+                    MAX_PAGE_SIZE)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+
+    etag = _etag("users", User.version(), limit, request.args.get('cursor'))
+    response = _not_modified(etag)
+    if response is not None:
+        return response
+    users, cursor = User.page(limit, request.args.get('cursor'))
+    response = jsonify([user.to_json() for user in users])
+    response.set_etag(etag)
+    if cursor is not None:
+        response.headers['X-Next-Cursor'] = cursor
+        response.headers['Link'] = '<{}?{}>; rel="next"'.format(
+            request.base_url, urlencode({'limit': limit, 'cursor': cursor}))
+    return response
+
+
+def _etag(*parts) -> str:
+    """ Return the entity tag of the representation identified by parts
+    """
+    text = ":".join(str(part) for part in parts)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _not_modified(etag: str) -> Optional[Response]:
+    """ Return a 304 response if the client has the representation of this
+    ETag, None otherwise
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def _user_response(user: User) -> Response:
+    """ Return the JSON of a user with its ETag, or 304 without
+    serializing the user if the client has it already
+    `updated_at` only keeps seconds once stored, so the ETag also holds
+    the store version, which changes with every save and remove.
+    """
+    etag = _etag(user.id, user.updated_at.isoformat(), User.version())
+    response = _not_modified(etag)
+    if response is not None:
+        return response
+    response = jsonify(user.to_json())
+    response.set_etag(etag)
+    return response
+
+
+def _json_array(users: Iterable[User]) -> Iterator[str]:
+    """ Yield the JSON array of users, STREAM_CHUNK_SIZE users at a time
+    """
+    chunk = []
+    separator = "["
+    for user in users:
+        chunk.append(separator + json.dumps(user.to_json()))
+        separator = ","
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("]" if separator == "," else "[]")
+    yield "".join(chunk)
+
+
+def _gzip(chunks: Iterable[str]) -> Iterator[bytes]:
+    """ Compress text chunks as they come, in the gzip format
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -23,6 +137,7 @@ def view_one_user(user_id: str = None) -> str:
       - User ID
     Return:
       - User object JSON represented
+      - 304 if the ETag in If-None-Match is current
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -30,7 +145,7 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return _user_response(user)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
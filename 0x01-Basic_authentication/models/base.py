@@ -2,36 +2,62 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from typing import TypeVar, List, Iterable, Iterator, Dict, Optional, Tuple
+from os import getenv
 import uuid
 
+from models.decoding import TIMESTAMP_FORMAT, parse_timestamp
+from models.indexes import HashIndex, SortedIndex
+from models.json_storage import JsonStorage
+from models.query import Query
+from models.serializer import (CachedSerializable, Serializable,
+                               make_serializer)
+from models.sqlite_storage import SqliteStorage
 
-TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
 
+SERIALIZERS = {}
 
-class Base():
+# JSON cache mode: Base derives from CachedSerializable, so each object
+# keeps the dictionaries returned by `to_json` until one of its attributes
+# is set or it is saved
+JSON_CACHE = getenv("BASE_JSON_CACHE", "0") == "1"
+
+# Storage engine: objects are kept in memory and `.db_<Class>.json` files
+# by default, or in the SQLite database BASE_SQLITE_PATH with
+# BASE_STORAGE=sqlite
+if getenv("BASE_STORAGE", "json") == "sqlite":
+    STORAGE = SqliteStorage(getenv("BASE_SQLITE_PATH", ".db.sqlite3"))
+else:
+    STORAGE = JsonStorage()
+
+
+class Base(CachedSerializable if JSON_CACHE else Serializable):
     """ Base class
     """
 
+    # Attributes are stored in slots instead of a dictionary per object;
+    # subclasses list their own, or get a `__dict__` as usual
+    __slots__ = ("id", "created_at", "updated_at")
+
+    # Attributes with a secondary hash index, used by `search` to find
+    # objects by equality without scanning them all
+    INDEXED_ATTRIBUTES = ()
+
+    # Attributes with a secondary sorted index, used by `query` for ranges,
+    # prefixes and ordering; the ID always has one, which orders the pages
+    # of `page` and `iterate`
+    SORTED_ATTRIBUTES = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -47,66 +73,73 @@ class Base():
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
-        return result
+        serializer = SERIALIZERS.get(self.__class__.__name__)
+        if serializer is None:
+            serializer = self.__class__._serializer()
+        return self._json(serializer, for_serialization)
 
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def _serializer(cls):
+        """ Return the `to_json` function built for the class
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        if SERIALIZERS.get(s_class) is None:
+            SERIALIZERS[s_class] = make_serializer(
+                cls._slot_names(), cls.__dictoffset__ != 0)
+        return SERIALIZERS[s_class]
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def _slot_names(cls) -> List[str]:
+        """ Return the attribute slots of the class and its parents, in
+        class then declaration order
+        """
+        return [
+            key for klass in reversed(cls.__mro__)
+            for key in klass.__dict__.get('__slots__', ())
+            if key not in ('__dict__', '__weakref__', '_json_cache')
+        ]
+
+    @classmethod
+    def load_from_file(cls):
+        """ Load all objects from file
+        """
+        STORAGE.load(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        STORAGE.save_all(cls)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def flush(cls):
+        """ Persist the mutations still pending in write-behind mode
+        """
+        STORAGE.flush(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        STORAGE.save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        STORAGE.remove(self)
+
+    @classmethod
+    def version(cls) -> str:
+        """ Return the version of the objects of the class, which changes
+        with every save, remove and load
+        """
+        return STORAGE.version(cls)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return STORAGE.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,24 +147,102 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page(cls, limit: int, cursor: Optional[str] = None
+             ) -> Tuple[List[TypeVar('Base')], Optional[str]]:
+        """ Return up to `limit` objects in ID order, after the ID `cursor`,
+        and the cursor of the next page, None on the last one
+        """
+        return STORAGE.page(cls, limit, cursor)
+
+    @classmethod
+    def iterate(cls, batch_size: int = 100) -> Iterator[TypeVar('Base')]:
+        """ Yield all objects in ID order, one page of `batch_size` at a
+        time
+        """
+        cursor = None
+        while True:
+            objs, cursor = cls.page(batch_size, cursor)
+            yield from objs
+            if cursor is None:
+                return
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return STORAGE.get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
+        return list(cls.iter_search(attributes))
+
+    @classmethod
+    def iter_search(cls, attributes: dict = {}
+                    ) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects with matching attributes as they are found,
+        without building the others of a lazy load
+        Objects saved or removed meanwhile may or may not be yielded.
+        """
+        for obj in cls._candidates(attributes):
             for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+                if getattr(obj, k) != v:
+                    break
+            else:
+                yield obj
+
+    @classmethod
+    def find_first(cls, attributes: dict = {}) -> Optional[TypeVar('Base')]:
+        """ Return the first object with matching attributes, or None,
+        without looking further
+        """
+        return next(cls.iter_search(attributes), None)
+
+    @classmethod
+    def query(cls) -> Query:
+        """ Return a query over all objects, to narrow with `where`,
+        `order_by` and `limit`
+        """
+        return Query(cls)
+
+    @classmethod
+    def _indexes(cls) -> Dict[str, HashIndex]:
+        """ Return the secondary hash indexes of the class, if the storage
+        engine keeps them
+        """
+        return STORAGE.indexes(cls)
+
+    @classmethod
+    def _sorted_indexes(cls) -> Dict[str, SortedIndex]:
+        """ Return the secondary sorted indexes of the class, if the storage
+        engine keeps them
+        """
+        return STORAGE.sorted_indexes(cls)
+
+    @classmethod
+    def _select(cls, predicates: list, order_by: Optional[str],
+                reverse: bool, limit: Optional[int]
+                ) -> Optional[Tuple[str, Iterable[TypeVar('Base')], bool]]:
+        """ Return the access, candidates and ordering of a query run by the
+        storage engine, or None if it leaves it to the query planner
+        """
+        return STORAGE.select(cls, predicates, order_by, reverse, limit)
+
+    @classmethod
+    def _attribute_from_json(cls, obj_json: dict, attribute: str):
+        """ Return the value an attribute has once an object is built from
+        its JSON dictionary
+        """
+        value = obj_json.get(attribute)
+        if attribute in ("created_at", "updated_at") and value is not None:
+            return parse_timestamp(value)
+        return value
+
+    @classmethod
+    def _candidates(cls, attributes: dict) -> Iterable[TypeVar('Base')]:
+        """ Return the objects which may match equality attributes, as
+        narrowed down by the storage engine
+        """
+        return STORAGE.candidates(cls, attributes)
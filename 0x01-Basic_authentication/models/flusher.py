@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+""" Flusher module
+"""
+from typing import Any, Callable
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Flusher():
+    """ Background thread persisting the pending mutations in batches
+
+    Mutations are queued per class and persisted together, at the latest
+    `interval_ms` after the first one, or as soon as `max_pending` are
+    queued, by `write(cls, ops)`. Mutations whose write fails are queued
+    again and retried, an interval later.
+    """
+
+    def __init__(self, interval_ms: int, max_pending: int,
+                 write: Callable[[type, list], None]):
+        """ Initialize an idle flusher
+        """
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.write = write
+        self.__pending = {}
+        self.__count = 0
+        self.__cond = threading.Condition()
+        self.__flushing = threading.Lock()
+        self.__thread = None
+
+    def mark(self, cls: type, op: str, obj: Any):
+        """ Queue a mutation of an object of class `cls`
+        """
+        with self.__cond:
+            self.__pending.setdefault(cls, []).append((op, obj))
+            self.__count += 1
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run,
+                                                 daemon=True)
+                self.__thread.start()
+            if self.__count == 1 or self.__count >= self.max_pending:
+                self.__cond.notify()
+
+    def flush(self):
+        """ Persist the pending mutations now
+        Each class is handed its mutations in order, in one call to
+        `write`. The mutations of a failed call are queued again, ahead
+        of newer ones, and its exception is raised once the other classes
+        are flushed.
+        """
+        error = None
+        with self.__flushing:
+            with self.__cond:
+                pending = self.__pending
+                self.__pending = {}
+                self.__count = 0
+            for cls, ops in pending.items():
+                try:
+                    self.write(cls, ops)
+                except Exception as e:
+                    self.__requeue(cls, ops)
+                    if error is None:
+                        error = e
+        if error is not None:
+            raise error
+
+    def __requeue(self, cls: type, ops: list):
+        """ Queue failed mutations again, before those queued since
+        """
+        with self.__cond:
+            self.__pending[cls] = ops + self.__pending.get(cls, [])
+            self.__count += len(ops)
+
+    def __run(self):
+        """ Flush whenever mutations are pending, once the interval has
+        elapsed or enough of them are queued
+        """
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__count > 0)
+                self.__cond.wait_for(
+                    lambda: self.__count >= self.max_pending,
+                    timeout=self.interval)
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception("write-behind flush failed, retrying in "
+                                 "%.3fs", self.interval)
+                time.sleep(self.interval)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+""" Indexes module
+"""
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterable, Iterator, List, Tuple
+
+
+_MISSING = object()
+
+
+class HashIndex():
+    """ Secondary hash index: attribute value -> IDs of objects
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty index on an attribute
+        """
+        self.attribute = attribute
+        self.__ids = {}
+        self.__values = {}
+        self.__unhashable = {}
+
+    def add(self, obj_id: str, value: Any):
+        """ Index an object ID under the current value of the attribute
+        """
+        old = self.__values.get(obj_id, _MISSING)
+        if old is not _MISSING:
+            if old is value or type(old) is type(value) and old == value:
+                return
+            self.discard(obj_id)
+        try:
+            self.__ids.setdefault(value, {})[obj_id] = None
+        except TypeError:
+            self.__unhashable[obj_id] = None
+        self.__values[obj_id] = value
+
+    def update(self, pairs: Iterable[Tuple[str, Any]]):
+        """ Index many (object ID, value) pairs
+        """
+        for obj_id, value in pairs:
+            self.add(obj_id, value)
+
+    def discard(self, obj_id: str):
+        """ Remove an object ID from the index
+        """
+        value = self.__values.pop(obj_id, _MISSING)
+        if value is _MISSING:
+            return
+        if self.__unhashable.pop(obj_id, _MISSING) is not _MISSING:
+            return
+        bucket = self.__ids[value]
+        del bucket[obj_id]
+        if len(bucket) == 0:
+            del self.__ids[value]
+
+    def lookup(self, value: Any) -> List[str]:
+        """ Return the IDs of objects which may have this value
+        Objects holding unhashable values are always candidates.
+        Raises TypeError if the value itself is unhashable.
+        """
+        ids = list(self.__ids.get(value, ()))
+        if self.__unhashable:
+            ids.extend(self.__unhashable)
+        return ids
+
+    def clear(self):
+        """ Remove all IDs from the index
+        """
+        self.__ids.clear()
+        self.__values.clear()
+        self.__unhashable.clear()
+
+
+class SortedIndex():
+    """ Secondary sorted index: IDs of objects ordered by attribute value,
+    then by ID
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty index on an attribute
+        """
+        self.attribute = attribute
+        self.__entries = []
+        self.__keys = []
+        self.__values = {}
+        self.__none = {}
+        self.__unordered = {}
+
+    def add(self, obj_id: str, value: Any):
+        """ Index an object ID under the current value of the attribute
+        None, and values which cannot be compared with the others, are
+        kept aside.
+        """
+        old = self.__values.get(obj_id, _MISSING)
+        if old is not _MISSING:
+            if old is value or type(old) is type(value) and old == value:
+                return
+            self.discard(obj_id)
+        self.__values[obj_id] = value
+        if value is None:
+            self.__none[obj_id] = None
+            return
+        try:
+            i = bisect_right(self.__entries, (value, obj_id))
+        except TypeError:
+            self.__unordered[obj_id] = None
+            return
+        self.__entries.insert(i, (value, obj_id))
+        self.__keys.insert(i, value)
+
+    def update(self, pairs: Iterable[Tuple[str, Any]]):
+        """ Index many (object ID, value) pairs
+        An empty index sorts them once instead of inserting them one by
+        one, which is quadratic.
+        """
+        pairs = list(pairs)
+        if self.__values:
+            for obj_id, value in pairs:
+                self.add(obj_id, value)
+            return
+        entries = []
+        for obj_id, value in pairs:
+            self.__values[obj_id] = value
+            if value is None:
+                self.__none[obj_id] = None
+            else:
+                entries.append((value, obj_id))
+        try:
+            entries.sort()
+        except TypeError:
+            self.clear()
+            for obj_id, value in pairs:
+                self.add(obj_id, value)
+            return
+        self.__entries = entries
+        self.__keys = [value for value, _ in entries]
+
+    def discard(self, obj_id: str):
+        """ Remove an object ID from the index
+        """
+        value = self.__values.pop(obj_id, _MISSING)
+        if value is _MISSING:
+            return
+        if value is None:
+            del self.__none[obj_id]
+            return
+        if self.__unordered.pop(obj_id, _MISSING) is not _MISSING:
+            return
+        i = bisect_left(self.__entries, (value, obj_id))
+        del self.__entries[i]
+        del self.__keys[i]
+
+    def irange(self, low: Any = _MISSING, high: Any = _MISSING,
+               inclusive: Tuple[bool, bool] = (True, True),
+               reverse: bool = False) -> Iterator[str]:
+        """ Yield the IDs of objects whose value is between `low` and
+        `high` (each bound optional), in value then ID order
+        Raises TypeError if a bound cannot be compared with the values.
+        """
+        start, stop = 0, len(self.__entries)
+        if low is not _MISSING:
+            find = bisect_left if inclusive[0] else bisect_right
+            start = find(self.__keys, low)
+        if high is not _MISSING:
+            find = bisect_right if inclusive[1] else bisect_left
+            stop = find(self.__keys, high)
+        positions = range(start, stop)
+        if reverse:
+            positions = reversed(positions)
+        return self.__ids(positions)
+
+    def unordered(self) -> List[str]:
+        """ Return the IDs of objects whose value could not be ordered,
+        which may match any range
+        """
+        return list(self.__unordered)
+
+    def unindexed(self) -> List[str]:
+        """ Return the IDs of objects whose value is None or could not be
+        ordered, which no range scan yields
+        """
+        return list(self.__unordered) + list(self.__none)
+
+    def __ids(self, positions: range) -> Iterator[str]:
+        """ Yield the IDs at positions of the index, as long as they exist
+        """
+        entries = self.__entries
+        for i in positions:
+            if i < len(entries):
+                yield entries[i][1]
+
+    def clear(self):
+        """ Remove all IDs from the index
+        """
+        self.__entries.clear()
+        self.__keys.clear()
+        self.__values.clear()
+        self.__none.clear()
+        self.__unordered.clear()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+""" Journal module
+"""
+from os import path
+from typing import Iterator, List, Tuple
+import json
+import os
+import threading
+
+from models.decoding import loads
+
+
+class Journal():
+    """ Append-only log of the mutations of one class, one JSON line each
+
+    The journal is replayed over the last snapshot when loading. A
+    compaction rotates it to `<file>.old`, writes a new snapshot and then
+    deletes the rotated file; a compaction interrupted in between leaves
+    `<file>.old` behind, which is replayed before the current journal.
+
+    `entries` counts the mutations in the journal files, replayed ones
+    included, to tell when to compact.
+    """
+
+    def __init__(self, file_path: str):
+        """ Initialize a journal stored in `file_path`
+        """
+        self.file_path = file_path
+        self.old_path = file_path + ".old"
+        self.entries = 0
+        self.truncated = False
+        self.compacting = False
+        self.compaction = threading.Lock()
+        self.__file = None
+        self.__lock = threading.Lock()
+
+    def append(self, op: str, obj_id: str, obj_json: dict = None):
+        """ Append one mutation: `save` with the object JSON, or `remove`
+        """
+        self.append_many([(op, obj_id, obj_json)])
+
+    def append_many(self, mutations: List[Tuple[str, str, dict]]):
+        """ Append (op, id, object JSON) mutations with a single write
+        """
+        lines = []
+        for op, obj_id, obj_json in mutations:
+            entry = {"op": op, "id": obj_id}
+            if obj_json is not None:
+                entry["obj"] = obj_json
+            lines.append(json.dumps(entry) + "\n")
+        with self.__lock:
+            if self.__file is None:
+                self.__file = open(self.file_path, 'a')
+            self.__file.write("".join(lines))
+            self.__file.flush()
+            self.entries += len(lines)
+
+    def replay(self) -> Iterator[Tuple[str, str, dict]]:
+        """ Yield the (op, id, object JSON) mutations in order, counting
+        them in `entries`
+        A truncated last line, left by a crash, is ignored and sets
+        `truncated`: appending after it would corrupt the next line.
+        """
+        self.entries = 0
+        self.truncated = False
+        for file_path in (self.old_path, self.file_path):
+            if not path.exists(file_path):
+                continue
+            with open(file_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = loads(line)
+                    except ValueError:
+                        self.truncated = True
+                        break
+                    self.entries += 1
+                    yield entry["op"], entry["id"], entry.get("obj")
+
+    def interrupted(self) -> bool:
+        """ Whether a rotated journal was left by an interrupted compaction
+        """
+        return path.exists(self.old_path)
+
+    def rotate(self):
+        """ Move the current entries aside, to `<file>.old`
+        """
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+            self.entries = 0
+            self.truncated = False
+            if not path.exists(self.file_path):
+                return
+            if not path.exists(self.old_path):
+                os.replace(self.file_path, self.old_path)
+                return
+            with open(self.old_path, 'a') as old, \
+                    open(self.file_path, 'r') as current:
+                old.write(current.read())
+            os.remove(self.file_path)
+
+    def discard_rotated(self):
+        """ Delete the rotated entries, once a snapshot includes them
+        """
+        if path.exists(self.old_path):
+            os.remove(self.old_path)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+""" JSON storage module
+"""
+from os import getenv, path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import atexit
+import json
+import os
+import threading
+import uuid
+
+from models.decoding import loads
+from models.flusher import Flusher
+from models.indexes import HashIndex, SortedIndex
+from models.journal import Journal
+from models.lazy import LazyObjects
+from models.storage import Storage
+
+
+DATA = {}
+INDEXES = {}
+SORTED_INDEXES = {}
+VERSIONS = {}
+JOURNALS = {}
+LOCKS = {}
+
+# Prefix of the store versions, telling apart those of another process
+STORE_EPOCH = uuid.uuid4().hex[:8]
+
+# Journal mode: each mutation appends one line to `.db_<Class>.journal`
+# instead of rewriting `.db_<Class>.json`, which is only rewritten by a
+# background compaction every BASE_JOURNAL_COMPACT_EVERY mutations
+JOURNAL = getenv("BASE_JOURNAL", "0") == "1"
+JOURNAL_COMPACT_EVERY = int(getenv("BASE_JOURNAL_COMPACT_EVERY", "1000"))
+
+# Write-behind mode: mutations are persisted by a background thread, at
+# most BASE_WRITE_BEHIND_MS milliseconds later or as soon as
+# BASE_WRITE_BEHIND_MAX are pending, and when the process exits
+WRITE_BEHIND_MS = int(getenv("BASE_WRITE_BEHIND_MS", "0"))
+WRITE_BEHIND_MAX = int(getenv("BASE_WRITE_BEHIND_MAX", "100"))
+
+# Lazy mode: `.db_<Class>.json` is memory-mapped and only the offsets of
+# its objects are read on load; each object is built on first access
+LAZY_LOAD = getenv("BASE_LAZY_LOAD", "0") == "1"
+
+
+class JsonStorage(Storage):
+    """ Objects of each class kept in memory, in `DATA`, and persisted to
+    `.db_<Class>.json`
+
+    Secondary indexes on INDEXED_ATTRIBUTES and SORTED_ATTRIBUTES are kept
+    in memory too.
+    """
+
+    def __init__(self):
+        """ Initialize the store, with its write-behind flusher if enabled
+        """
+        self.flusher = None
+        if WRITE_BEHIND_MS > 0:
+            self.flusher = Flusher(WRITE_BEHIND_MS, WRITE_BEHIND_MAX,
+                                   self.write)
+            atexit.register(self.flusher.flush)
+
+    def load(self, cls: type):
+        """ Load all objects from file
+        """
+        self.flush(cls)
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        DATA[s_class] = {}
+        self.reindex(cls)
+        objs = None
+        if LAZY_LOAD and path.exists(file_path):
+            objs = LazyObjects.open(cls, file_path)
+        if objs is not None:
+            DATA[s_class] = objs
+        elif path.exists(file_path):
+            with open(file_path, 'rb') as f:
+                objs_json = loads(f.read())
+                for obj_id, obj_json in objs_json.items():
+                    DATA[s_class][obj_id] = cls(**obj_json)
+        if JOURNAL:
+            journal = self.__journal(cls)
+            for op, obj_id, obj_json in journal.replay():
+                if op == "save":
+                    DATA[s_class][obj_id] = cls(**obj_json)
+                else:
+                    DATA[s_class].pop(obj_id, None)
+            if journal.interrupted() or journal.truncated or \
+                    journal.entries >= JOURNAL_COMPACT_EVERY:
+                self.compact(cls)
+        self.reindex(cls)
+        self.__bump_version(cls)
+
+    def save_all(self, cls: type):
+        """ Save all objects to file
+        """
+        if JOURNAL:
+            self.compact(cls)
+            return
+        self.__write_snapshot(cls, self.__snapshot_items(cls))
+
+    def flush(self, cls: type):
+        """ Persist the mutations still pending in write-behind mode
+        """
+        if self.flusher is not None:
+            self.flusher.flush()
+
+    def save(self, obj: Any):
+        """ Add or replace an object, then persist it
+        """
+        cls = type(obj)
+        with self.__lock(cls):
+            self.__objects(cls)[obj.id] = obj
+            for index in self.__all_indexes(cls):
+                index.add(obj.id, getattr(obj, index.attribute, None))
+            self.__bump_version(cls)
+            self.__persist(cls, "save", obj)
+
+    def remove(self, obj: Any):
+        """ Remove an object, then persist its removal
+        """
+        cls = type(obj)
+        with self.__lock(cls):
+            objs = self.__objects(cls)
+            if objs.get(obj.id) is None:
+                return
+            del objs[obj.id]
+            for index in self.__all_indexes(cls):
+                index.discard(obj.id)
+            self.__bump_version(cls)
+            self.__persist(cls, "remove", obj)
+
+    def get(self, cls: type, obj_id: str) -> Optional[Any]:
+        """ Return object by ID
+        """
+        return self.__objects(cls).get(obj_id)
+
+    def count(self, cls: type) -> int:
+        """ Count objects
+        """
+        return len(self.__objects(cls).keys())
+
+    def candidates(self, cls: type, attributes: dict) -> Iterable[Any]:
+        """ Return the objects which may match equality attributes:
+        those of an index lookup when one applies, all objects otherwise
+        """
+        objs = self.__objects(cls)
+        indexes = self.indexes(cls)
+        for k, v in attributes.items():
+            index = indexes.get(k)
+            if index is None:
+                continue
+            try:
+                ids = index.lookup(v)
+            except TypeError:
+                continue
+            return (obj for obj in map(objs.get, ids) if obj is not None)
+        if isinstance(objs, LazyObjects):
+            return objs.candidates(attributes)
+        return list(objs.values())
+
+    def page(self, cls: type, limit: int, cursor: Optional[str] = None
+             ) -> Tuple[List[Any], Optional[str]]:
+        """ Return up to `limit` objects in ID order, after the ID `cursor`,
+        and the cursor of the next page, None on the last one
+        """
+        index = self.sorted_indexes(cls)["id"]
+        if cursor is None:
+            ids = index.irange()
+        else:
+            ids = index.irange(low=cursor, inclusive=(False, True))
+        objs = self.__objects(cls)
+        page = []
+        for obj_id in ids:
+            obj = objs.get(obj_id)
+            if obj is None:
+                continue
+            if len(page) == limit:
+                return page, page[-1].id
+            page.append(obj)
+        return page, None
+
+    def version(self, cls: type) -> str:
+        """ Return the version of the objects of the class, which changes
+        with every save, remove and load
+        """
+        return "{}.{}".format(STORE_EPOCH, VERSIONS.get(cls.__name__, 0))
+
+    def indexes(self, cls: type) -> Dict[str, HashIndex]:
+        """ Return the secondary hash indexes of the class
+        """
+        return self.__build_indexes(cls, INDEXES, HashIndex,
+                                    cls.INDEXED_ATTRIBUTES)
+
+    def sorted_indexes(self, cls: type) -> Dict[str, SortedIndex]:
+        """ Return the secondary sorted indexes of the class
+        """
+        return self.__build_indexes(cls, SORTED_INDEXES, SortedIndex,
+                                    ("id",) + tuple(cls.SORTED_ATTRIBUTES))
+
+    def reindex(self, cls: type):
+        """ Drop the secondary indexes, rebuilt on first use
+        """
+        INDEXES.pop(cls.__name__, None)
+        SORTED_INDEXES.pop(cls.__name__, None)
+
+    def compact(self, cls: type):
+        """ Fold the journal into a new snapshot file
+        """
+        journal = self.__journal(cls)
+        with journal.compaction:
+            with self.__lock(cls):
+                items = self.__snapshot_items(cls)
+                journal.rotate()
+            self.__write_snapshot(cls, items)
+            journal.discard_rotated()
+            journal.compacting = False
+
+    def write(self, cls: type, ops: List[tuple]):
+        """ Persist (op, object) mutations: append them to the journal in
+        one write, or rewrite the file once
+        """
+        if not JOURNAL:
+            self.save_all(cls)
+            return
+        journal = self.__journal(cls)
+        journal.append_many([
+            (op, obj.id, obj.to_json(True) if op == "save" else None)
+            for op, obj in ops
+        ])
+        if journal.entries >= JOURNAL_COMPACT_EVERY \
+                and not journal.compacting:
+            journal.compacting = True
+            threading.Thread(target=self.compact, args=(cls,),
+                             daemon=True).start()
+
+    def __objects(self, cls: type) -> dict:
+        """ Return the objects of the class by ID
+        """
+        return DATA.setdefault(cls.__name__, {})
+
+    def __snapshot_items(self, cls: type) -> list:
+        """ Return the (ID, object) pairs to write, with the stored JSON in
+        place of the objects not loaded yet
+        """
+        with self.__lock(cls):
+            objs = self.__objects(cls)
+            if isinstance(objs, LazyObjects):
+                return objs.raw_items()
+            return list(objs.items())
+
+    def __write_snapshot(self, cls: type, items: list):
+        """ Write objects to file, replacing it atomically
+        The layout is the one of `json.dump`, which lazy loading expects.
+        """
+        file_path = ".db_{}.json".format(cls.__name__)
+        entries = []
+        for obj_id, obj in items:
+            if type(obj) is bytes:
+                obj_text = obj.decode()
+            else:
+                obj_text = json.dumps(obj.to_json(True))
+            entries.append("{}: {}".format(json.dumps(obj_id), obj_text))
+
+        tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write("{" + ", ".join(entries) + "}")
+        os.replace(tmp_path, file_path)
+
+    def __persist(self, cls: type, op: str, obj: Any):
+        """ Record a mutation, now or in the background in write-behind mode
+        Called with the class lock held.
+        """
+        if self.flusher is not None:
+            self.flusher.mark(cls, op, obj)
+            return
+        self.write(cls, [(op, obj)])
+
+    def __journal(self, cls: type) -> Journal:
+        """ Return the journal of the class
+        """
+        s_class = cls.__name__
+        if JOURNALS.get(s_class) is None:
+            JOURNALS[s_class] = Journal(".db_{}.journal".format(s_class))
+        return JOURNALS[s_class]
+
+    def __lock(self, cls: type) -> threading.RLock:
+        """ Return the lock serializing the mutations of the class
+        """
+        return LOCKS.setdefault(cls.__name__, threading.RLock())
+
+    def __bump_version(self, cls: type):
+        """ Change the version of the objects of the class
+        """
+        with self.__lock(cls):
+            VERSIONS[cls.__name__] = VERSIONS.get(cls.__name__, 0) + 1
+
+    def __all_indexes(self, cls: type) -> list:
+        """ Return all the secondary indexes of the class
+        """
+        return list(self.indexes(cls).values()) + \
+            list(self.sorted_indexes(cls).values())
+
+    def __build_indexes(self, cls: type, registry: dict, index_class: type,
+                        attributes: Iterable[str]) -> dict:
+        """ Return the indexes of the class in `registry`, built from all
+        objects on first use
+        """
+        s_class = cls.__name__
+        indexes = registry.get(s_class)
+        if indexes is not None:
+            return indexes
+        with self.__lock(cls):
+            if registry.get(s_class) is None:
+                indexes = {attr: index_class(attr) for attr in attributes}
+                for index in indexes.values():
+                    index.update(self.__attribute_values(cls,
+                                                         index.attribute))
+                registry[s_class] = indexes
+            return registry[s_class]
+
+    def __attribute_values(self, cls: type, attribute: str
+                           ) -> Iterable[tuple]:
+        """ Return the (ID, attribute value) pairs of all objects, without
+        loading those of a lazy load
+        """
+        objs = DATA.get(cls.__name__, {})
+        if attribute == "id":
+            return [(obj_id, obj_id) for obj_id in objs]
+        if isinstance(objs, LazyObjects):
+            return objs.attribute_values(attribute)
+        return [(obj_id, getattr(obj, attribute, None))
+                for obj_id, obj in objs.items()]
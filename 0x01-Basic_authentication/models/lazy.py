@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+""" Lazy module
+"""
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import mmap
+import re
+import threading
+
+from models.decoding import loads
+
+
+# End of the key of an entry whose value is an object, in a file written
+# by `json.dump` with the default separators
+KEY_END = re.compile(rb'": \{')
+
+
+def scan_entries(buf: bytes) -> Optional[Dict[str, Tuple[int, int]]]:
+    """ Return the (start, end) offsets of each object JSON by ID, or None
+    if the file is not laid out as expected
+
+    Keys are only searched for, not parsed: an entry must directly follow
+    the opening brace or the closing brace of the previous entry, which
+    rules out objects nested in the values. Keys holding escapes are not
+    supported. The last entry is parsed, so that a truncated file is not
+    taken for a shorter one.
+    """
+    if buf[:1] != b"{" or buf[-1:] != b"}":
+        return None
+    spans = {}
+    start = end = None
+    for match in KEY_END.finditer(buf):
+        key_end = match.start()
+        key_start = buf.rfind(b'"', 0, key_end) + 1
+        if b"\\" in buf[key_start - 1:key_end + 1]:
+            return None
+        if start is None:
+            if key_start != 2:
+                return None
+        elif buf[key_start - 4:key_start - 1] != b"}, ":
+            return None
+        else:
+            spans[key] = (start, key_start - 3)
+        key = buf[key_start:key_end].decode()
+        start = match.end() - 1
+    if start is None:
+        return spans if buf == b"{}" else None
+    end = len(buf) - 1
+    if buf[end - 1:end] != b"}":
+        return None
+    try:
+        loads(buf[start:end])
+    except ValueError:
+        return None
+    spans[key] = (start, end)
+    return spans
+
+
+class LazyObjects(MutableMapping):
+    """ Objects of a class by ID, built from a memory-mapped file on first
+    access
+
+    Entries not accessed yet are kept as offsets in the file; `cls` must
+    provide `_attribute_from_json`, used to read their attributes without
+    building them.
+    """
+
+    def __init__(self, cls: type, buf: mmap.mmap,
+                 spans: Dict[str, Tuple[int, int]]):
+        """ Initialize the objects of `cls` stored at `spans` in `buf`
+        """
+        self.__cls = cls
+        self.__buf = buf
+        self.__entries = dict(spans)
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def open(cls, obj_cls: type, file_path: str) -> 'LazyObjects':
+        """ Map a file written by `save_to_file`, or return None if it
+        cannot be loaded lazily
+        """
+        with open(file_path, 'rb') as f:
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return None
+        spans = scan_entries(buf)
+        if spans is None:
+            buf.close()
+            return None
+        return cls(obj_cls, buf, spans)
+
+    def __getitem__(self, key: str) -> Any:
+        """ Return an object, building it on first access
+        """
+        value = self.__entries[key]
+        if type(value) is not tuple:
+            return value
+        with self.__lock:
+            value = self.__entries[key]
+            if type(value) is tuple:
+                value = self.__cls(**self.__load(value))
+                self.__entries[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        """ Set an object
+        """
+        self.__entries[key] = value
+
+    def __delitem__(self, key: str):
+        """ Remove an object
+        """
+        del self.__entries[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """ Iterate over IDs, in file then insertion order
+        """
+        return iter(self.__entries)
+
+    def __len__(self) -> int:
+        """ Count objects, built or not
+        """
+        return len(self.__entries)
+
+    def __contains__(self, key: Any) -> bool:
+        """ Whether an ID is present, without building the object
+        """
+        return key in self.__entries
+
+    def raw_items(self) -> List[Tuple[str, Any]]:
+        """ Return (ID, object) pairs, with the JSON bytes in the file in
+        place of the objects not built yet
+        """
+        return [
+            (key, self.__buf[value[0]:value[1]]
+             if type(value) is tuple else value)
+            for key, value in list(self.__entries.items())
+        ]
+
+    def attribute_values(self, attribute: str) -> Iterator[Tuple[str, Any]]:
+        """ Yield (ID, value of an attribute) pairs without building the
+        objects
+        """
+        for key, value in list(self.__entries.items()):
+            if type(value) is tuple:
+                yield key, self.__cls._attribute_from_json(
+                    self.__load(value), attribute)
+            else:
+                yield key, getattr(value, attribute, None)
+
+    def candidates(self, attributes: dict) -> Iterator[Any]:
+        """ Yield the objects which may match equality attributes, building
+        only those whose stored JSON matches
+        """
+        for key, value in list(self.__entries.items()):
+            if type(value) is tuple:
+                obj_json = self.__load(value)
+                if any(k in obj_json and
+                       self.__cls._attribute_from_json(obj_json, k) != v
+                       for k, v in attributes.items()):
+                    continue
+            try:
+                yield self[key]
+            except KeyError:
+                continue
+
+    def __load(self, span: Tuple[int, int]) -> dict:
+        """ Parse the object JSON at `span`
+        """
+        return loads(self.__buf[span[0]:span[1]])
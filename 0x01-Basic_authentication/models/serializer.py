@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+""" Serializer module
+"""
+from datetime import datetime
+from typing import Any, Callable, Iterable
+
+from models.decoding import TIMESTAMP_FORMAT
+
+
+def format_timestamp(value: datetime) -> str:
+    """ Format a datetime as TIMESTAMP_FORMAT
+    `isoformat` gives the same text for naive datetimes of years 1000 and
+    later, many times faster than `strftime`.
+    """
+    if value.tzinfo is None and value.year >= 1000:
+        return value.isoformat(timespec="seconds")
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def make_serializer(keys: Iterable[str], has_dict: bool) -> Callable:
+    """ Build the `to_json(obj, for_serialization)` function of a class
+    whose attributes are `keys`, in that order, and those of its
+    `__dict__` if `has_dict`
+
+    Attributes starting with `_` are only read for serialization, and
+    datetimes are formatted with `format_timestamp`.
+    """
+    all_keys = tuple(keys)
+    public_keys = tuple(key for key in all_keys if key[0] != "_")
+
+    def to_json(obj: Any, for_serialization: bool) -> dict:
+        """ Return the JSON dictionary of an object
+        """
+        result = {}
+        for key in all_keys if for_serialization else public_keys:
+            try:
+                value = getattr(obj, key)
+            except AttributeError:
+                continue
+            if type(value) is datetime:
+                value = format_timestamp(value)
+            result[key] = value
+        if has_dict:
+            for key, value in obj.__dict__.items():
+                if not for_serialization and key[0] == "_":
+                    continue
+                if type(value) is datetime:
+                    value = format_timestamp(value)
+                result[key] = value
+        return result
+
+    return to_json
+
+
+class Serializable():
+    """ Objects whose `to_json` runs the serializer of their class on
+    every call
+    """
+
+    __slots__ = ()
+
+    def _json(self, serializer: Callable, for_serialization: bool) -> dict:
+        """ Return the JSON dictionary built by the serializer
+        """
+        return serializer(self, for_serialization)
+
+
+class CachedSerializable(Serializable):
+    """ Objects keeping the dictionaries returned by `to_json` until one
+    of their attributes is set
+    """
+
+    __slots__ = ("_json_cache",)
+
+    def __setattr__(self, name: str, value: Any):
+        """ Set an attribute, dropping the cached JSON dictionaries
+        """
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_json_cache", None)
+
+    def _json(self, serializer: Callable, for_serialization: bool) -> dict:
+        """ Return a copy of the cached JSON dictionary, built by the
+        serializer on first use
+        """
+        cache = getattr(self, "_json_cache", None)
+        if cache is None:
+            cache = [None, None]
+            object.__setattr__(self, "_json_cache", cache)
+        if cache[for_serialization] is None:
+            cache[for_serialization] = serializer(self, for_serialization)
+        return dict(cache[for_serialization])
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+""" SQLite storage module
+"""
+from datetime import datetime
+from os import path
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import json
+import sqlite3
+import threading
+import uuid
+
+from models.decoding import loads
+from models.query import prefix_end
+from models.serializer import format_timestamp
+from models.storage import Storage
+
+# Seconds a connection waits for the write lock of another one
+BUSY_TIMEOUT = 30
+
+
+class SqliteStorage(Storage):
+    """ Objects of each class stored in a table of a SQLite database, in
+    WAL mode: one row per object, holding its JSON
+
+    Each attribute of INDEXED_ATTRIBUTES and SORTED_ATTRIBUTES also gets a
+    column with an index, which `search` uses for equalities and `query`
+    for its conditions and ordering. Objects are
+    built from their row on every access, so only those in use are in
+    memory, and other processes may read and write the same database.
+    """
+
+    def __init__(self, file_path: str):
+        """ Initialize the store of the database at `file_path`, created
+        on first use
+        """
+        self.file_path = file_path
+        self.__local = threading.local()
+        self.__tables = {}
+        self.__lock = threading.Lock()
+
+    def load(self, cls: type):
+        """ Create the table of a class, filled from `.db_<Class>.json`
+        when it is empty and that file exists
+        """
+        table, columns = self.__table(cls)
+        file_path = ".db_{}.json".format(cls.__name__)
+        if not path.exists(file_path) or self.count(cls) > 0:
+            return
+        with open(file_path, 'rb') as f:
+            objs_json = loads(f.read())
+        rows = [self.__row(cls(**obj_json), columns)
+                for obj_json in objs_json.values()]
+        connection = self.__connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if connection.execute("SELECT COUNT(*) FROM {}".format(
+                    table)).fetchone()[0] > 0:
+                return
+            connection.executemany(self.__insert(table, columns), rows)
+            self.__bump_version(connection, cls)
+
+    def save_all(self, cls: type):
+        """ Nothing to do: every save is committed
+        """
+
+    def save(self, obj: Any):
+        """ Insert or replace the row of an object
+        """
+        cls = type(obj)
+        table, columns = self.__table(cls)
+        connection = self.__connection()
+        with connection:
+            connection.execute(self.__insert(table, columns),
+                               self.__row(obj, columns))
+            self.__bump_version(connection, cls)
+
+    def remove(self, obj: Any):
+        """ Delete the row of an object
+        """
+        cls = type(obj)
+        table, columns = self.__table(cls)
+        connection = self.__connection()
+        with connection:
+            cursor = connection.execute(
+                "DELETE FROM {} WHERE id = ?".format(table), (obj.id,))
+            if cursor.rowcount > 0:
+                self.__bump_version(connection, cls)
+
+    def get(self, cls: type, obj_id: str) -> Optional[Any]:
+        """ Return object by ID
+        """
+        table, columns = self.__table(cls)
+        row = self.__connection().execute(
+            "SELECT json FROM {} WHERE id = ?".format(table),
+            (obj_id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**loads(row[0]))
+
+    def count(self, cls: type) -> int:
+        """ Count objects
+        """
+        table, columns = self.__table(cls)
+        return self.__connection().execute(
+            "SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+
+    def candidates(self, cls: type, attributes: dict) -> Iterator[Any]:
+        """ Yield the objects whose indexed columns match equality
+        attributes, as the rows are read
+        """
+        table, columns = self.__table(cls)
+        conditions = []
+        parameters = []
+        for k, v in attributes.items():
+            if k != "id" and k not in columns:
+                continue
+            if v is None:
+                conditions.append("{} IS NULL".format(_quote(k)))
+                continue
+            try:
+                parameters.append(_column_value(v))
+            except TypeError:
+                continue
+            conditions.append("{} = ?".format(_quote(k)))
+        sql = "SELECT json FROM {}".format(table)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        for row in self.__connection().execute(sql, parameters):
+            yield cls(**loads(row[0]))
+
+    def page(self, cls: type, limit: int, cursor: Optional[str] = None
+             ) -> Tuple[List[Any], Optional[str]]:
+        """ Return up to `limit` objects in ID order, after the ID `cursor`,
+        and the cursor of the next page, None on the last one
+        """
+        table, columns = self.__table(cls)
+        if cursor is None:
+            rows = self.__connection().execute(
+                "SELECT json FROM {} ORDER BY id LIMIT ?".format(table),
+                (limit + 1,)).fetchall()
+        else:
+            rows = self.__connection().execute(
+                "SELECT json FROM {} WHERE id > ? ORDER BY id LIMIT ?"
+                .format(table), (cursor, limit + 1)).fetchall()
+        page = [cls(**loads(row[0])) for row in rows[:limit]]
+        if len(rows) > limit:
+            return page, page[-1].id
+        return page, None
+
+    def version(self, cls: type) -> str:
+        """ Return the version of the objects of the class, which changes
+        with every save and remove, in any process
+        """
+        self.__table(cls)
+        epoch, counter = self.__connection().execute(
+            "SELECT epoch, counter FROM _versions WHERE class = ?",
+            (cls.__name__,)).fetchone()
+        return "{}.{}".format(epoch, counter)
+
+    def select(self, cls: type, predicates: List[Any],
+               order_by: Optional[str] = None, reverse: bool = False,
+               limit: Optional[int] = None
+               ) -> Optional[Tuple[str, Iterable[Any], bool]]:
+        """ Run the conditions on index columns in the WHERE clause and the
+        ordering by an index column in ORDER BY, then ID, NULL last
+
+        Range conditions are inclusive in SQL, since stored timestamps only
+        keep seconds: the caller checks every condition on the objects.
+        The limit is only pushed down when there is no condition to check.
+        Returns None when neither the conditions nor the ordering can use
+        a column.
+        """
+        table, columns = self.__table(cls)
+        usable = set(columns) | {"id"}
+        conditions = []
+        parameters = []
+        pushed = []
+        for predicate in predicates:
+            if predicate.attribute not in usable:
+                continue
+            condition = _condition(predicate)
+            if condition is None:
+                continue
+            conditions.append(condition[0])
+            parameters += condition[1]
+            pushed.append(predicate)
+        ordered = order_by in usable
+        if not conditions and not ordered:
+            return None
+
+        sql = "SELECT json FROM {}".format(table)
+        access = "SQLite index columns:"
+        if pushed:
+            access += " where " + " and ".join(str(p) for p in pushed)
+        statements = [(conditions, [])]
+        if ordered:
+            direction = " DESC" if reverse else ""
+            access += " ordered by {}{}".format(order_by, direction.lower())
+            column = _quote(order_by)
+            if order_by == "id":
+                statements = [(conditions, ["id" + direction])]
+            else:
+                statements = [
+                    (conditions + ["{} IS NOT NULL".format(column)],
+                     [column + direction, "id" + direction]),
+                    (conditions + ["{} IS NULL".format(column)],
+                     ["id" + direction]),
+                ]
+        if limit is not None and not predicates:
+            access += " limit {}".format(limit)
+        else:
+            limit = None
+
+        queries = []
+        for where, order in statements:
+            query = sql
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            if order:
+                query += " ORDER BY " + ", ".join(order)
+            if limit is not None:
+                query += " LIMIT {:d}".format(limit)
+            queries.append(query)
+
+        def objects() -> Iterator[Any]:
+            connection = self.__connection()
+            for query in queries:
+                for row in connection.execute(query, parameters):
+                    yield cls(**loads(row[0]))
+        return access, objects(), ordered
+
+    def __connection(self) -> sqlite3.Connection:
+        """ Return the connection of the current thread, in WAL mode
+        """
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_path, timeout=BUSY_TIMEOUT)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+        return connection
+
+    def __table(self, cls: type) -> Tuple[str, List[str]]:
+        """ Return the quoted table name and the index columns of the class,
+        creating the table, its missing columns and their indexes on first
+        use
+        """
+        s_class = cls.__name__
+        columns = self.__tables.get(s_class)
+        if columns is not None:
+            return _quote(s_class), columns
+        columns = [attribute for attribute in dict.fromkeys(
+            tuple(cls.INDEXED_ATTRIBUTES) + tuple(cls.SORTED_ATTRIBUTES))
+            if attribute != "id"]
+        table = _quote(s_class)
+        with self.__lock:
+            connection = self.__connection()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS {} "
+                    "(id TEXT PRIMARY KEY, json TEXT NOT NULL)".format(table))
+                existing = {row[1] for row in connection.execute(
+                    "PRAGMA table_info({})".format(table))}
+                for column in columns:
+                    if column not in existing:
+                        self.__add_column(connection, cls, column)
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS _versions (class TEXT "
+                    "PRIMARY KEY, epoch TEXT NOT NULL, counter INTEGER "
+                    "NOT NULL)")
+                connection.execute(
+                    "INSERT OR IGNORE INTO _versions VALUES (?, ?, 0)",
+                    (s_class, uuid.uuid4().hex[:8]))
+            self.__tables[s_class] = columns
+        return table, columns
+
+    def __add_column(self, connection: sqlite3.Connection, cls: type,
+                     column: str):
+        """ Add an index column to the table of the class, filled from the
+        JSON of the rows already there
+        """
+        table = _quote(cls.__name__)
+        connection.execute("ALTER TABLE {} ADD COLUMN {}".format(
+            table, _quote(column)))
+        connection.executemany(
+            "UPDATE {} SET {} = ? WHERE id = ?".format(table, _quote(column)),
+            [(_stored_value(cls._attribute_from_json(loads(obj_json),
+                                                     column)), obj_id)
+             for obj_id, obj_json in connection.execute(
+                 "SELECT id, json FROM {}".format(table)).fetchall()])
+        connection.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+            _quote("{}_{}".format(cls.__name__, column)), table,
+            _quote(column)))
+
+    def __insert(self, table: str, columns: List[str]) -> str:
+        """ Return the statement inserting or replacing a row
+        """
+        return "INSERT OR REPLACE INTO {} (id, json{}) VALUES (?, ?{})".format(
+            table, "".join(", " + _quote(column) for column in columns),
+            ", ?" * len(columns))
+
+    def __row(self, obj: Any, columns: List[str]) -> list:
+        """ Return the values of the row of an object
+        """
+        return [obj.id, json.dumps(obj.to_json(True))] + \
+            [_stored_value(getattr(obj, column, None)) for column in columns]
+
+    def __bump_version(self, connection: sqlite3.Connection, cls: type):
+        """ Change the version of the objects of the class, in the current
+        transaction
+        """
+        connection.execute(
+            "UPDATE _versions SET counter = counter + 1 WHERE class = ?",
+            (cls.__name__,))
+
+
+def _quote(name: str) -> str:
+    """ Quote a table, column or index name
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _condition(predicate: Any) -> Optional[Tuple[str, list]]:
+    """ Return the SQL condition and parameters selecting at least the rows
+    whose objects meet a query condition, None if SQL cannot narrow it down
+    """
+    column = _quote(predicate.attribute)
+    value = predicate.value
+    if predicate.op == "eq" and value is None:
+        return "{} IS NULL".format(column), []
+    if predicate.op == "prefix":
+        if type(value) is not str:
+            return None
+        end = prefix_end(value)
+        if end is None:
+            return "{} >= ?".format(column), [value]
+        return "{0} >= ? AND {0} < ?".format(column), [value, end]
+    try:
+        value = _column_value(value)
+    except TypeError:
+        return None
+    if predicate.op == "eq":
+        return "{} = ?".format(column), [value]
+    if predicate.op in ("gt", "ge"):
+        return "{} >= ?".format(column), [value]
+    return "{} <= ?".format(column), [value]
+
+
+def _column_value(value: Any) -> Any:
+    """ Return the value of an index column for an attribute value:
+    datetimes as TIMESTAMP_FORMAT text, other values as they are
+    Raises TypeError if SQLite cannot hold the value.
+    """
+    if isinstance(value, datetime):
+        return format_timestamp(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, str):
+        return str(value)
+    raise TypeError("no column value for {!r}".format(type(value)))
+
+
+def _stored_value(value: Any) -> Any:
+    """ Return the value of an index column for an attribute value, NULL
+    for None and those SQLite cannot hold
+    """
+    if value is None:
+        return None
+    try:
+        return _column_value(value)
+    except TypeError:
+        return None
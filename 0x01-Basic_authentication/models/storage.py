@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class Storage(ABC):
+    """ Storage engine of the Base classes: where their objects are kept
+    and how they are found
+
+    Every method takes the class of the objects, or one of its objects.
+    """
+
+    @abstractmethod
+    def load(self, cls: type):
+        """ Load the objects of a class from their persistent store
+        """
+
+    @abstractmethod
+    def save_all(self, cls: type):
+        """ Persist all objects of a class
+        """
+
+    def flush(self, cls: type):
+        """ Persist the mutations not persisted yet
+        """
+
+    @abstractmethod
+    def save(self, obj: Any):
+        """ Add or replace an object
+        """
+
+    @abstractmethod
+    def remove(self, obj: Any):
+        """ Remove an object, if stored
+        """
+
+    @abstractmethod
+    def get(self, cls: type, obj_id: str) -> Optional[Any]:
+        """ Return the object of a class with this ID, or None
+        """
+
+    @abstractmethod
+    def count(self, cls: type) -> int:
+        """ Return the number of objects of a class
+        """
+
+    @abstractmethod
+    def candidates(self, cls: type, attributes: dict) -> Iterable[Any]:
+        """ Return the objects of a class which may have the `attributes`
+        values: all of them at worst, as the caller checks them
+        """
+
+    @abstractmethod
+    def page(self, cls: type, limit: int, cursor: Optional[str] = None
+             ) -> Tuple[List[Any], Optional[str]]:
+        """ Return up to `limit` objects of a class in ID order, after the
+        ID `cursor`, and the cursor of the next page, None on the last one
+        """
+
+    @abstractmethod
+    def version(self, cls: type) -> str:
+        """ Return the version of the objects of a class, which changes
+        with every save, remove and load
+        """
+
+    def indexes(self, cls: type) -> Dict[str, Any]:
+        """ Return the in-memory hash indexes of a class by attribute, for
+        the query planner
+        """
+        return {}
+
+    def sorted_indexes(self, cls: type) -> Dict[str, Any]:
+        """ Return the in-memory sorted indexes of a class by attribute,
+        for the query planner
+        """
+        return {}
+
+    def select(self, cls: type, predicates: List[Any],
+               order_by: Optional[str] = None, reverse: bool = False,
+               limit: Optional[int] = None
+               ) -> Optional[Tuple[str, Iterable[Any], bool]]:
+        """ Run a query in the engine itself, for engines which can
+        Returns a description of the access, the candidate objects, a
+        superset of the matching ones, and whether they come in the
+        requested order; or None to let the query planner use the indexes.
+        """
+        return None
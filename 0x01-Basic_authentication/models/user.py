@@ -9,6 +9,11 @@ class User(Base):
     """ User class
     """
 
+    INDEXED_ATTRIBUTES = ("email",)
+    SORTED_ATTRIBUTES = ("email", "created_at", "updated_at")
+
+    __slots__ = ("email", "_password", "first_name", "last_name")
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Tests of the write-behind flusher
+"""
+import logging
+import threading
+import unittest
+
+from models.flusher import Flusher
+
+
+class FlakyWriter():
+    """ Writer failing its first `failures` calls, recording the others
+    """
+
+    def __init__(self, failures: int):
+        """ Initialize a writer with nothing written
+        """
+        self.failures = failures
+        self.written = []
+        self.done = threading.Event()
+
+    def __call__(self, cls: type, ops: list):
+        """ Fail, or record the mutations
+        """
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("No space left on device")
+        self.written.extend(ops)
+        self.done.set()
+
+
+class TestFlusher(unittest.TestCase):
+    """ Flusher behaviour when its writer fails
+    """
+
+    def setUp(self):
+        """ Silence the expected failure logs
+        """
+        logging.getLogger("models.flusher").disabled = True
+
+    def tearDown(self):
+        """ Restore the failure logs
+        """
+        logging.getLogger("models.flusher").disabled = False
+
+    def test_background_retry(self):
+        """ A failed batch is retried, and the thread keeps flushing """
+        writer = FlakyWriter(1)
+        flusher = Flusher(10, 100, writer)
+        flusher.mark(object, "save", 1)
+        flusher.mark(object, "save", 2)
+        self.assertTrue(writer.done.wait(5))
+        self.assertEqual(writer.written, [("save", 1), ("save", 2)])
+
+        writer.done.clear()
+        flusher.mark(object, "remove", 1)
+        self.assertTrue(writer.done.wait(5))
+        self.assertEqual(writer.written[-1], ("remove", 1))
+
+    def test_flush_raises_and_requeues(self):
+        """ An explicit flush raises the error and keeps the mutations """
+        writer = FlakyWriter(1)
+        flusher = Flusher(60000, 100, writer)
+        flusher.mark(object, "save", 1)
+        with self.assertRaises(OSError):
+            flusher.flush()
+        flusher.mark(object, "save", 2)
+        flusher.flush()
+        self.assertEqual(writer.written, [("save", 1), ("save", 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
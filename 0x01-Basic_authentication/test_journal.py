@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+""" Tests of the journal replay and its compaction on load
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from models import json_storage
+from models.journal import Journal
+from models.json_storage import JsonStorage
+from models.user import User
+
+
+class TestJournal(unittest.TestCase):
+    """ Journal replay, on its own
+    """
+
+    def setUp(self):
+        """ Work in a temporary directory
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, "journal")
+
+    def tearDown(self):
+        """ Remove the temporary directory
+        """
+        self.tmp.cleanup()
+
+    def write(self, file_path: str, ids: list, tail: str = ""):
+        """ Write `save` entries for `ids`, then `tail`
+        """
+        with open(file_path, 'w') as f:
+            for obj_id in ids:
+                f.write(json.dumps({"op": "save", "id": obj_id,
+                                    "obj": {"id": obj_id}}) + "\n")
+            f.write(tail)
+
+    def test_replay_counts_entries(self):
+        """ Replayed entries count toward the compaction """
+        self.write(self.file_path, ["1", "2", "3"])
+        journal = Journal(self.file_path)
+        ids = [obj_id for _, obj_id, _ in journal.replay()]
+        self.assertEqual(ids, ["1", "2", "3"])
+        self.assertEqual(journal.entries, 3)
+        self.assertFalse(journal.truncated)
+        journal.append("remove", "1")
+        self.assertEqual(journal.entries, 4)
+
+    def test_rotated_first(self):
+        """ Entries left by an interrupted compaction are replayed first """
+        self.write(self.file_path + ".old", ["1", "2"])
+        self.write(self.file_path, ["3"])
+        journal = Journal(self.file_path)
+        ids = [obj_id for _, obj_id, _ in journal.replay()]
+        self.assertEqual(ids, ["1", "2", "3"])
+        self.assertEqual(journal.entries, 3)
+        self.assertTrue(journal.interrupted())
+
+    def test_truncated_tail(self):
+        """ A truncated last line is skipped and reported """
+        self.write(self.file_path, ["1", "2"], '{"op": "save", "id": "3", "o')
+        journal = Journal(self.file_path)
+        ids = [obj_id for _, obj_id, _ in journal.replay()]
+        self.assertEqual(ids, ["1", "2"])
+        self.assertEqual(journal.entries, 2)
+        self.assertTrue(journal.truncated)
+
+
+class TestJournalLoad(unittest.TestCase):
+    """ JsonStorage loading a journal left by a previous process
+    """
+
+    def setUp(self):
+        """ Journal the users of a new store in a temporary directory
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        for patcher in (
+                mock.patch("models.base.STORAGE", JsonStorage()),
+                mock.patch("models.json_storage.JOURNAL", True),
+                mock.patch("models.json_storage.JOURNAL_COMPACT_EVERY", 100),
+                mock.patch.dict("models.json_storage.DATA", clear=True),
+                mock.patch.dict("models.json_storage.JOURNALS", clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        User.load_from_file()
+        self.ids = []
+        for i in range(5):
+            user = User(email="user{}@example.com".format(i))
+            user.save()
+            self.ids.append(user.id)
+
+    def tearDown(self):
+        """ Remove the temporary directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def reload(self):
+        """ Load the users again, with the journals of a new process
+        """
+        json_storage.JOURNALS.clear()
+        User.load_from_file()
+        return json_storage.JOURNALS["User"]
+
+    def lines(self) -> int:
+        """ Count the lines of the journal file
+        """
+        if not os.path.exists(".db_User.journal"):
+            return 0
+        with open(".db_User.journal") as f:
+            return len(f.readlines())
+
+    def test_inherited_entries(self):
+        """ A journal under the threshold is kept, and its entries counted """
+        self.assertEqual(self.lines(), 5)
+        journal = self.reload()
+        self.assertEqual(journal.entries, 5)
+        self.assertEqual(self.lines(), 5)
+        self.assertEqual(sorted(u.id for u in User.all()), sorted(self.ids))
+
+    def test_compact_on_load(self):
+        """ A journal over the threshold is compacted on load """
+        with mock.patch("models.json_storage.JOURNAL_COMPACT_EVERY", 5):
+            journal = self.reload()
+        self.assertEqual(journal.entries, 0)
+        self.assertEqual(self.lines(), 0)
+        with open(".db_User.json") as f:
+            self.assertEqual(sorted(json.load(f)), sorted(self.ids))
+
+    def test_truncated_tail(self):
+        """ A truncated journal is compacted on load, so that the next
+        entries are not appended to the partial line """
+        with open(".db_User.journal", 'a') as f:
+            f.write('{"op": "remove", "id": "')
+        self.reload()
+        user = User(email="late@example.com")
+        user.save()
+        self.reload()
+        self.assertEqual(sorted(u.id for u in User.all()),
+                         sorted(self.ids + [user.id]))
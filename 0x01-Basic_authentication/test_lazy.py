@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+""" Tests of the lazy loading of `.db_<Class>.json`
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from models import json_storage
+from models.json_storage import JsonStorage
+from models.lazy import LazyObjects, scan_entries
+from models.user import User
+
+TRICKY_VALUES = ['say "hi"', "}", '": {', '}, "x": {', "a\\b", "é",
+                 '"}', "{}", ""]
+
+
+class TestScanEntries(unittest.TestCase):
+    """ `scan_entries` against `json.load` on files written by `json.dump`
+    """
+
+    def check(self, data: dict, lazy: bool = True):
+        """ Scan `data` as written by `json.dump`: the spans must parse to
+        the same objects as `json.load`, or the scan must give up
+        """
+        buf = json.dumps(data).encode()
+        spans = scan_entries(buf)
+        if lazy:
+            self.assertIsNotNone(spans)
+        if spans is not None:
+            self.assertEqual(
+                {k: json.loads(buf[s:e]) for k, (s, e) in spans.items()},
+                json.loads(buf))
+        return spans
+
+    def test_plain(self):
+        """ Flat objects, and no object at all """
+        self.check({})
+        self.check({"1": {"id": "1", "email": "a@b.c"},
+                    "2": {"id": "2", "email": None, "n": 3}})
+        self.check({"1": {}, "2": {}})
+
+    def test_tricky_values(self):
+        """ Values holding quotes, braces or the key separator """
+        for value in TRICKY_VALUES:
+            self.check({"1": {"id": "1", "v": value},
+                        "2": {"v": value, "id": "2"}}, lazy=False)
+        self.check({"1": {"v": "}"}, "2": {"v": "{"}})
+
+    def test_nested(self):
+        """ Objects nested in the values make the scan give up """
+        for data in ({"1": {"meta": {"a": 1}}},
+                     {"1": {"a": {}, "b": {"c": {}}}, "2": {}},
+                     {"1": {"a": [{"b": {}}, {"c": {}}]}},
+                     {"1": {"v": 1}, "2": {"a": {"3": {}}}}):
+            self.assertIsNone(self.check(data, lazy=False))
+
+    def test_truncated(self):
+        """ Every truncation of a file is either rejected or parses """
+        for value in TRICKY_VALUES + ["x}}"]:
+            buf = json.dumps({"1": {"v": value}, "2": {"v": value}}).encode()
+            for size in range(len(buf)):
+                if scan_entries(buf[:size]) is not None:
+                    self.assertEqual(json.loads(buf[:size]), {})
+
+    def test_escaped_keys(self):
+        """ Keys holding escapes make the scan give up """
+        self.assertIsNone(self.check({'a"b': {}}, lazy=False))
+
+
+class TestLazyLoad(unittest.TestCase):
+    """ Users loaded lazily against users loaded eagerly
+    """
+
+    def setUp(self):
+        """ Work in a temporary directory
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        for patcher in (
+                mock.patch("models.base.STORAGE", JsonStorage()),
+                mock.patch.dict("models.json_storage.DATA", clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        User.load_from_file()
+
+    def tearDown(self):
+        """ Remove the temporary directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def load(self, lazy: bool) -> dict:
+        """ Return the JSON of the users loaded from file, by ID
+        """
+        with mock.patch("models.json_storage.LAZY_LOAD", lazy):
+            User.load_from_file()
+        return {u.id: u.to_json(True) for u in User.all()}
+
+    def check(self, values: list, lazy: bool):
+        """ Save users with `values` as first names, and compare a lazy load
+        with an eager one
+        """
+        for i, value in enumerate(values):
+            User(email="user{}@example.com".format(i),
+                 first_name=value).save()
+        eager = self.load(False)
+        self.assertEqual(self.load(True), eager)
+        self.assertEqual(len(eager), len(values))
+        self.assertEqual(isinstance(json_storage.DATA["User"], LazyObjects),
+                         lazy)
+        for value in values:
+            users = User.search({"first_name": value})
+            self.assertEqual([u.first_name for u in users], [value])
+
+    def test_lazy(self):
+        """ Values with braces and non-ASCII text load lazily """
+        self.check(["}", "{}", "", "é", "x}}", None], True)
+
+    def test_fallback(self):
+        """ Values the scan gives up on load eagerly """
+        self.check(TRICKY_VALUES, False)
+
+
+if __name__ == "__main__":
+    unittest.main()
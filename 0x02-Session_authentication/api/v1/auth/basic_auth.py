@@ -69,10 +69,7 @@ class BasicAuth(Auth):
         if user_pwd is None or not isinstance(user_pwd, str):
             return None
         try:
-            users = User.search({"email": user_email})
-            if not users or users == []:
-                return None
-            for u in users:
+            for u in User.iter_search({"email": user_email}):
                 if u.is_valid_password(user_pwd):
                     return u
             return None
@@ -41,17 +41,17 @@ class SessionDBAuth(SessionExpAuth):
             Optional[str]: User ID, or None if session is invalid or expired.
         """
         try:
-            sessions = UserSession.search({'session_id': session_id})
+            session = UserSession.find_first({'session_id': session_id})
         except Exception:
             return None
-        if not sessions:
+        if session is None:
             return None
         cur_time = datetime.now()
         time_span = timedelta(seconds=self.session_duration)
-        exp_time = sessions[0].created_at + time_span
+        exp_time = session.created_at + time_span
         if exp_time < cur_time:
             return None
-        return sessions[0].user_id
+        return session.user_id
 
     def destroy_session(self, request=None) -> bool:
         """
@@ -65,10 +65,10 @@ class SessionDBAuth(SessionExpAuth):
         if not session_id:
             return False
         try:
-            sessions = UserSession.search({'session_id': session_id})
+            session = UserSession.find_first({'session_id': session_id})
         except Exception:
             return False
-        if not sessions:
+        if session is None:
             return False
-        sessions[0].remove()
+        session.remove()
         return True
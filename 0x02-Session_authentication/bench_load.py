@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark of `User.load_from_file` on a generated `.db_User.json`.
+Each loader runs in its own process, so that peak RSS is its own:
+  legacy     json + strptime, as before the fast path
+  fast       json + fromisoformat
+  orjson     BASE_ORJSON=1, orjson + fromisoformat
+  lazy       BASE_LAZY_LOAD=1, objects built on first access
+
+Usage:
+    ./bench_load.py --users 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+MODES = ("legacy", "fast", "orjson", "lazy")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def generate(file_path: str, users: int):
+    """
+    Write a `.db_User.json` of `users` users, in the `save_to_file` layout.
+    """
+    now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    with open(file_path, "w") as f:
+        f.write("{")
+        for i in range(users):
+            obj_id = str(uuid.uuid4())
+            obj_json = {
+                "id": obj_id, "created_at": now, "updated_at": now,
+                "email": "user{}@example.com".format(i),
+                "_password": "{:064x}".format(i),
+                "first_name": "First{}".format(i),
+                "last_name": "Last{}".format(i),
+            }
+            if i > 0:
+                f.write(", ")
+            f.write("{}: {}".format(json.dumps(obj_id), json.dumps(obj_json)))
+        f.write("}")
+
+
+def child(mode: str):
+    """
+    Load the users of the current directory and print the load time and
+    peak RSS as JSON.
+    """
+    import models.base
+    from models.user import User
+    if mode == "legacy":
+        models.base.parse_timestamp = (
+            lambda value: datetime.strptime(value, "%Y-%m-%dT%H:%M:%S"))
+    start = time.perf_counter()
+    User.load_from_file()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "users": User.count(),
+        "seconds": elapsed,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def run(mode: str, directory: str) -> dict:
+    """
+    Run one loader in a subprocess and return its measurements.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT,
+               BASE_LAZY_LOAD="1" if mode == "lazy" else "0",
+               BASE_ORJSON="1" if mode == "orjson" else "0")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode],
+        cwd=directory, env=env, check=True, stdout=subprocess.PIPE)
+    return json.loads(output.stdout)
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Generate the file once and time every loader on it.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000000,
+                        help="number of users in the file")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES,
+                        help="loaders to benchmark")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args.child)
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        generate(os.path.join(directory, ".db_User.json"), args.users)
+        for mode in args.modes:
+            result = run(mode, directory)
+            print("{:<10} {:>9} users  {:>8.2f}s  peak RSS {:>8.1f}MB".format(
+                mode, result["users"], result["seconds"], result["rss_mb"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
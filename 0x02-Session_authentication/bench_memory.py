@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the memory held by User and UserSession objects.
+Compares the slotted classes with the previous layout, where every
+attribute lived in a `__dict__` per object (materialized by the first
+`to_json`, as `save_to_file` does for every object).
+
+Usage:
+    ./bench_memory.py --objects 100000
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Callable, List
+
+from models.user import User
+from models.user_session import UserSession
+
+
+class DictUser():
+    """ User laid out as before: attributes in `__dict__`
+    """
+
+    def __init__(self, **kwargs):
+        """ Set the attributes User sets
+        """
+        self.id = kwargs.get('id')
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+        self.__dict__
+
+
+class DictUserSession():
+    """ UserSession laid out as before: attributes in `__dict__`
+    """
+
+    def __init__(self, **kwargs):
+        """ Set the attributes UserSession sets
+        """
+        self.id = kwargs.get('id')
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+        self.__dict__
+
+
+def users(count: int) -> List[dict]:
+    """ Build the JSON dictionaries of `count` users
+    """
+    return [{
+        "id": str(uuid.uuid4()), "email": "user{}@example.com".format(i),
+        "_password": "{:064x}".format(i), "first_name": "First{}".format(i),
+        "last_name": "Last{}".format(i),
+    } for i in range(count)]
+
+
+def sessions(count: int) -> List[dict]:
+    """ Build the JSON dictionaries of `count` sessions
+    """
+    return [{
+        "id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()),
+        "session_id": str(uuid.uuid4()),
+    } for _ in range(count)]
+
+
+def measure(factory: Callable, objs_json: List[dict]) -> int:
+    """ Return the bytes allocated to build objects from `objs_json`,
+    not counting the strings they share with it
+    """
+    gc.collect()
+    tracemalloc.start()
+    objs = [factory(**obj_json) for obj_json in objs_json]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return size
+
+
+def main(argv: List[str] = None) -> int:
+    """ Print the bytes per object of each layout
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--objects", type=int, default=100000,
+                        help="number of objects per layout")
+    args = parser.parse_args(argv)
+
+    for name, cases, objs_json in (
+            ("User", (("__dict__", DictUser), ("__slots__", User)),
+             users(args.objects)),
+            ("UserSession", (("__dict__", DictUserSession),
+                             ("__slots__", UserSession)),
+             sessions(args.objects))):
+        for layout, factory in cases:
+            size = measure(factory, objs_json)
+            print("{:<12} {:<10} {:>8.1f} bytes/object  {:>8.1f}MB".format(
+                name, layout, size / args.objects, size / 2 ** 20))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark of `User.query` against filtering and sorting `User.all()`.
+Users are built in memory, with spread creation dates; each query prints
+its plan, the time of both ways, and checks they return the same users.
+
+Usage:
+    ./bench_query.py --users 1000000
+"""
+import argparse
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+import models.base
+import models.json_storage
+from models.user import User
+
+START = datetime(2020, 1, 1)
+
+
+def populate(users: int):
+    """
+    Put `users` users in memory, as a load from file does.
+    """
+    objs = {}
+    for i in range(users):
+        created_at = START + timedelta(seconds=i * 37 % users)
+        user = User(id=str(uuid.uuid4()),
+                    email="user{}@example.com".format(i),
+                    first_name="First{}".format(i % 1000),
+                    last_name="Last{}".format(i))
+        user.created_at = user.updated_at = created_at
+        objs[user.id] = user
+    models.json_storage.DATA["User"] = objs
+    models.base.STORAGE.reindex(User)
+
+
+def naive(condition: Callable, order_by: str = None, reverse: bool = False,
+          limit: int = None) -> List[User]:
+    """
+    Filter and sort all users, as callers of `User.all()` do.
+    """
+    users = [user for user in User.all() if condition(user)]
+    if order_by is not None:
+        users.sort(key=lambda user: (getattr(user, order_by), user.id),
+                   reverse=reverse)
+    return users if limit is None else users[:limit]
+
+
+def timed(function: Callable) -> tuple:
+    """
+    Return the result of a call and its duration in milliseconds.
+    """
+    start = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Print the plan and timings of each query.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000000,
+                        help="number of users")
+    args = parser.parse_args(argv)
+
+    populate(args.users)
+    _, build = timed(lambda: (User._indexes(), User._sorted_indexes()))
+    print("{} users, indexes built in {:.0f}ms\n".format(args.users, build))
+
+    day = START + timedelta(seconds=args.users // 2)
+    cases = (
+        (User.query().where("email", eq="user42@example.com"),
+         lambda: naive(lambda u: u.email == "user42@example.com")),
+        (User.query().where("email", prefix="user12345"),
+         lambda: naive(lambda u: u.email.startswith("user12345"))),
+        (User.query().where("created_at", ge=day,
+                            lt=day + timedelta(hours=1))
+         .order_by("created_at"),
+         lambda: naive(lambda u: day <= u.created_at <
+                       day + timedelta(hours=1), "created_at")),
+        (User.query().order_by("created_at", reverse=True).limit(20),
+         lambda: naive(lambda u: True, "created_at", True, 20)),
+        (User.query().where("first_name", eq="First7")
+         .order_by("last_name").limit(10),
+         lambda: naive(lambda u: u.first_name == "First7", "last_name",
+                       False, 10)),
+    )
+    for query, baseline in cases:
+        print(query.explain())
+        users, planned = timed(query.all)
+        expected, scanned = timed(baseline)
+        same = [u.id for u in users] == [u.id for u in expected] or \
+            sorted(u.id for u in users) == sorted(u.id for u in expected)
+        print("  -> {} users: query {:.1f}ms, scan {:.1f}ms ({:.0f}x){}\n"
+              .format(len(users), planned, scanned,
+                      scanned / max(planned, 0.001),
+                      "" if same else "  RESULTS DIFFER"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
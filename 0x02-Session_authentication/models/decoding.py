@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+""" Decoding module
+"""
+from datetime import datetime
+from os import getenv
+from typing import Any, Union
+import json
+
+# orjson parses faster, but its dictionaries take more memory: it is only
+# used with BASE_ORJSON=1, and when installed
+orjson = None
+if getenv("BASE_ORJSON", "0") == "1":
+    try:
+        import orjson
+    except ImportError:
+        pass
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """ Parse JSON text, with orjson when it is enabled
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string
+    The usual `YYYY-MM-DDTHH:MM:SS` layout is parsed by
+    `datetime.fromisoformat`, many times faster than `strptime`.
+    """
+    if len(value) == 19 and value[10] == "T" \
+            and value[13] == ":" and value[16] == ":":
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+""" Query module
+"""
+from itertools import islice
+import heapq
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+
+OPERATORS = ("eq", "prefix", "gt", "ge", "lt", "le")
+SYMBOLS = {"eq": "=", "prefix": "starts with", "gt": ">", "ge": ">=",
+           "lt": "<", "le": "<="}
+
+
+class Predicate():
+    """ Condition on one attribute of the objects
+    """
+
+    def __init__(self, attribute: str, op: str, value: Any):
+        """ Initialize a condition `<attribute> <op> <value>`
+        """
+        self.attribute = attribute
+        self.op = op
+        self.value = value
+
+    def match(self, obj: Any) -> bool:
+        """ Whether an object meets the condition
+        A missing attribute is None, which is in no range.
+        """
+        value = getattr(obj, self.attribute, None)
+        if self.op == "eq":
+            return value == self.value
+        if self.op == "prefix":
+            return type(value) is str and value.startswith(self.value)
+        if value is None:
+            return False
+        try:
+            if self.op == "gt":
+                return value > self.value
+            if self.op == "ge":
+                return value >= self.value
+            if self.op == "lt":
+                return value < self.value
+            return value <= self.value
+        except TypeError:
+            return False
+
+    def __str__(self) -> str:
+        """ Text of the condition
+        """
+        return "{} {} {!r}".format(self.attribute, SYMBOLS[self.op],
+                                   self.value)
+
+
+class Query():
+    """ Query over the objects of a Base class: conditions on attributes,
+    order and limit
+
+    The candidates come, by order of preference, from a hash index
+    lookup on an equality, a sorted index range scan on a condition
+    (preferably on the ordering attribute), a sorted index scan on the
+    ordering attribute, or a scan of all objects, unless the storage
+    engine runs the query itself (see `Storage.select`). Every condition
+    is then checked on each candidate. Objects whose ordering attribute
+    is None come last.
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize a query over all objects of `cls`
+        """
+        self.__cls = cls
+        self.__predicates = []
+        self.__order_by = None
+        self.__reverse = False
+        self.__limit = None
+
+    def where(self, attribute: str, **conditions: Any) -> 'Query':
+        """ Add conditions on an attribute, given as `eq`, `prefix`, `gt`,
+        `ge`, `lt` or `le` keyword arguments
+        Raises ValueError on an unknown operator.
+        """
+        for op, value in conditions.items():
+            if op not in OPERATORS:
+                raise ValueError("unknown operator {!r}, expected one of {}"
+                                 .format(op, OPERATORS))
+            self.__predicates.append(Predicate(attribute, op, value))
+        return self
+
+    def order_by(self, attribute: str, reverse: bool = False) -> 'Query':
+        """ Order the objects by an attribute, then by ID
+        """
+        self.__order_by = attribute
+        self.__reverse = reverse
+        return self
+
+    def limit(self, count: int) -> 'Query':
+        """ Return at most `count` objects
+        """
+        self.__limit = count
+        return self
+
+    def all(self) -> List[Any]:
+        """ Return the matching objects
+        """
+        return list(self)
+
+    def first(self) -> Optional[Any]:
+        """ Return the first matching object, or None
+        """
+        return next(iter(self), None)
+
+    def explain(self) -> str:
+        """ Describe how the query is run
+        """
+        selected = self.__select()
+        if selected is not None:
+            access, objs, ordered = selected
+        else:
+            access, ids, ordered = self.__plan()
+        lines = ["Query on {}".format(self.__cls.__name__),
+                 "  access: {}".format(access)]
+        if self.__predicates:
+            lines.append("  filter: {}".format(
+                " and ".join(str(p) for p in self.__predicates)))
+        if self.__order_by is not None:
+            lines.append("  order: {}{}, {}".format(
+                self.__order_by, " desc" if self.__reverse else "",
+                "from the index" if ordered else self.__sort_method()))
+        if self.__limit is not None:
+            lines.append("  limit: {}".format(self.__limit))
+        return "\n".join(lines)
+
+    def __iter__(self) -> Iterator[Any]:
+        """ Yield the matching objects
+        """
+        selected = self.__select()
+        if selected is not None:
+            access, objs, ordered = selected
+        else:
+            access, ids, ordered = self.__plan()
+            if ids is None:
+                objs = self.__cls._candidates({
+                    p.attribute: p.value
+                    for p in self.__predicates if p.op == "eq"
+                })
+            else:
+                objs = (obj for obj in map(self.__cls.get, ids)
+                        if obj is not None)
+        matches = objs
+        if len(self.__predicates) == 1:
+            matches = filter(self.__predicates[0].match, objs)
+        elif self.__predicates:
+            matches = filter(self.__match, objs)
+        if self.__order_by is not None and not ordered:
+            matches = self.__sort(matches)
+        if self.__limit is not None:
+            matches = islice(matches, self.__limit)
+        return iter(matches)
+
+    def __match(self, obj: Any) -> bool:
+        """ Whether an object meets all the conditions
+        """
+        for predicate in self.__predicates:
+            if not predicate.match(obj):
+                return False
+        return True
+
+    def __select(self) -> Optional[Tuple[str, Iterable[Any], bool]]:
+        """ Let the storage engine run the query, if it can
+        """
+        return self.__cls._select(self.__predicates, self.__order_by,
+                                  self.__reverse, self.__limit)
+
+    def __plan(self) -> Tuple[str, Optional[Iterable[str]], bool]:
+        """ Choose where the candidates come from
+        Returns a description, the candidate IDs (None to scan all
+        objects), and whether they come in the requested order.
+        """
+        hash_indexes = self.__cls._indexes()
+        for p in self.__predicates:
+            if p.op != "eq" or p.attribute not in hash_indexes:
+                continue
+            try:
+                ids = hash_indexes[p.attribute].lookup(p.value)
+            except TypeError:
+                continue
+            return "hash index lookup on {}".format(p), ids, False
+
+        sorted_indexes = self.__cls._sorted_indexes()
+        attributes = sorted(
+            {p.attribute for p in self.__predicates
+             if p.attribute in sorted_indexes},
+            key=lambda attribute: attribute != self.__order_by)
+        for attribute in attributes:
+            index = sorted_indexes[attribute]
+            bounds, conditions = self.__bounds(attribute)
+            if not conditions:
+                continue
+            ordered = attribute == self.__order_by and not index.unordered()
+            try:
+                ids = index.irange(reverse=ordered and self.__reverse,
+                                   **bounds)
+            except TypeError:
+                continue
+            access = "sorted index range scan on {}".format(
+                " and ".join(str(p) for p in conditions))
+            return access, _chain(ids, index.unordered()), ordered
+
+        if self.__order_by in sorted_indexes:
+            index = sorted_indexes[self.__order_by]
+            ids = index.irange(reverse=self.__reverse)
+            access = "sorted index scan on {}".format(self.__order_by)
+            unindexed = sorted(index.unindexed(), reverse=self.__reverse)
+            return access, _chain(ids, unindexed), not index.unordered()
+        return "full scan", None, False
+
+    def __bounds(self, attribute: str) -> Tuple[dict, List[Predicate]]:
+        """ Return the `low`, `high` and `inclusive` arguments of a sorted
+        index range scan for the conditions on an attribute, and the
+        conditions they come from
+        """
+        kwargs = {}
+        low = high = None
+        for p in self.__predicates:
+            if p.attribute != attribute:
+                continue
+            if p.op in ("eq", "ge", "gt") and low is None:
+                kwargs["low"] = p.value
+                low = p
+            if p.op in ("eq", "le", "lt") and high is None:
+                kwargs["high"] = p.value
+                high = p
+            if p.op == "prefix" and low is None and type(p.value) is str:
+                kwargs["low"] = p.value
+                low = p
+                end = prefix_end(p.value)
+                if end is not None and high is None:
+                    kwargs["high"] = end
+                    high = p
+        kwargs["inclusive"] = (low is None or low.op != "gt",
+                               high is None or high.op in ("eq", "le"))
+        conditions = [p for p in (low, high) if p is not None]
+        if low is high:
+            conditions = conditions[:1]
+        return kwargs, conditions
+
+    def __sort_method(self) -> str:
+        """ Describe how the objects are ordered without an index
+        """
+        if self.__limit is not None:
+            return "top {} selected in memory".format(self.__limit)
+        return "sorted in memory"
+
+    def __sort(self, objs: Iterable[Any]) -> List[Any]:
+        """ Order objects by the ordering attribute then ID, None last by
+        ID
+        """
+        attribute = self.__order_by
+        present, absent = [], []
+        for obj in objs:
+            if getattr(obj, attribute, None) is None:
+                absent.append(obj)
+            else:
+                present.append(obj)
+
+        def key(obj):
+            return getattr(obj, attribute), obj.id
+        if self.__limit is None:
+            present.sort(key=key, reverse=self.__reverse)
+        elif self.__reverse:
+            present = heapq.nlargest(self.__limit, present, key=key)
+        else:
+            present = heapq.nsmallest(self.__limit, present, key=key)
+        absent.sort(key=lambda obj: obj.id, reverse=self.__reverse)
+        return present + absent
+
+
+def _chain(*iterables: Iterable[str]) -> Iterator[str]:
+    """ Yield the IDs of each iterable in turn
+    """
+    for ids in iterables:
+        yield from ids
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    """ Return the smallest string after all those starting with `prefix`,
+    or None if there is none
+    """
+    for i in range(len(prefix) - 1, -1, -1):
+        if ord(prefix[i]) < 0x10FFFF:
+            return prefix[:i] + chr(ord(prefix[i]) + 1)
+    return None
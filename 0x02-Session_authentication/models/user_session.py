@@ -8,6 +8,10 @@ class UserSession(Base):
     """User session.
     """
 
+    INDEXED_ATTRIBUTES = ("session_id", "user_id")
+
+    __slots__ = ("user_id", "session_id")
+
     def __init__(self, *args: list, **kwargs: dict):
         """User session instance initialized.
         """
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+""" Tests of the query planner on the JSON storage engine
+"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from models.json_storage import JsonStorage
+from models.user import User
+
+START = datetime(2020, 1, 1)
+
+
+class TestQueryPlanner(unittest.TestCase):
+    """ `User.query` plans and results against filtering all users
+    """
+
+    def setUp(self):
+        """ Store users with shared creation dates and a missing email
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        for patcher in (
+                mock.patch("models.base.STORAGE", JsonStorage()),
+                mock.patch.dict("models.json_storage.DATA", clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        User.load_from_file()
+        self.users = []
+        for i in range(60):
+            email = "user{}@example.com".format(i) if i != 5 else None
+            user = User(id="{:03d}".format((i * 7) % 60), email=email,
+                        first_name="First{}".format(i % 3))
+            user.created_at = START + timedelta(seconds=i // 2)
+            user.save()
+            self.users.append(user)
+
+    def tearDown(self):
+        """ Remove the temporary directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def expected(self, condition, order_by=None, reverse=False, limit=None):
+        """ Filter and sort the users in memory, None last
+        """
+        users = [u for u in self.users if condition(u)]
+        if order_by is not None:
+            present = [u for u in users if getattr(u, order_by) is not None]
+            present.sort(key=lambda u: (getattr(u, order_by), u.id),
+                         reverse=reverse)
+            users = present + sorted(
+                (u for u in users if getattr(u, order_by) is None),
+                key=lambda u: u.id, reverse=reverse)
+        return [u.id for u in users][:limit]
+
+    def check(self, query, expected, access, ordered=True):
+        """ Compare the IDs of a query with the expected ones, and check
+        its plan
+        """
+        ids = [u.id for u in query.all()]
+        if ordered:
+            self.assertEqual(ids, expected)
+        else:
+            self.assertEqual(sorted(ids), sorted(expected))
+        self.assertIn("access: " + access, query.explain())
+
+    def test_hash_index(self):
+        """ An equality on a hash index """
+        self.check(User.query().where("email", eq="user42@example.com"),
+                   self.expected(lambda u: u.email == "user42@example.com"),
+                   "hash index lookup on email", False)
+
+    def test_prefix(self):
+        """ A prefix on a sorted index """
+        self.check(User.query().where("email", prefix="user1")
+                   .order_by("email"),
+                   self.expected(lambda u: (u.email or "")
+                                 .startswith("user1"), "email"),
+                   "sorted index range scan on email starts with 'user1'")
+
+    def test_range_on_ordering_attribute(self):
+        """ A range scan on the ordering attribute keeps the order """
+        low = START + timedelta(seconds=3)
+        high = START + timedelta(seconds=9)
+        query = User.query().where("created_at", gt=low, le=high) \
+            .order_by("created_at", reverse=True)
+        self.check(query,
+                   self.expected(lambda u: low < u.created_at <= high,
+                                 "created_at", True),
+                   "sorted index range scan on created_at >")
+        self.assertIn("order: created_at desc, from the index",
+                      query.explain())
+
+    def test_order_and_limit(self):
+        """ A sorted index scan, with ties and None last """
+        self.check(User.query().order_by("created_at", reverse=True)
+                   .limit(7),
+                   self.expected(lambda u: True, "created_at", True, 7),
+                   "sorted index scan on created_at")
+        self.check(User.query().order_by("email"),
+                   self.expected(lambda u: True, "email"),
+                   "sorted index scan on email")
+        self.check(User.query().order_by("email", reverse=True),
+                   self.expected(lambda u: True, "email", True),
+                   "sorted index scan on email")
+
+    def test_full_scan(self):
+        """ Without an ordering index the top is selected in memory """
+        query = User.query().where("email", gt="user3") \
+            .order_by("first_name", reverse=True).limit(4)
+        self.check(query,
+                   self.expected(lambda u: (u.email or "") > "user3",
+                                 "first_name", True, 4),
+                   "sorted index range scan on email > 'user3'")
+        self.assertIn("top 4 selected in memory", query.explain())
+        query = User.query().where("first_name", eq="First2") \
+            .order_by("last_name").limit(4)
+        self.check(query,
+                   self.expected(lambda u: u.first_name == "First2",
+                                 "last_name", False, 4), "full scan")
+        self.assertIn("top 4 selected in memory", query.explain())
+
+    def test_unknown_operator(self):
+        """ An unknown operator raises a ValueError """
+        with self.assertRaises(ValueError):
+            User.query().where("email", like="user%")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+""" Tests of queries run by the SQLite storage engine
+"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from models.sqlite_storage import SqliteStorage
+from models.user import User
+
+START = datetime(2020, 1, 1)
+
+
+class TestSqliteQuery(unittest.TestCase):
+    """ `User.query` on SqliteStorage against filtering all users
+    """
+
+    def setUp(self):
+        """ Store users with shared creation dates and a missing email
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        storage = SqliteStorage(os.path.join(self.tmp.name, "db.sqlite3"))
+        patcher = mock.patch("models.base.STORAGE", storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = []
+        for i in range(60):
+            email = "user{}@example.com".format(i) if i != 5 else None
+            user = User(id="{:03d}".format((i * 7) % 60), email=email,
+                        first_name="First{}".format(i % 3))
+            user.created_at = START + timedelta(seconds=i // 2)
+            user.save()
+            self.users.append(user)
+
+    def tearDown(self):
+        """ Remove the database
+        """
+        self.tmp.cleanup()
+
+    def expected(self, condition, order_by=None, reverse=False, limit=None):
+        """ Filter and sort the users in memory, None last
+        """
+        users = [u for u in self.users if condition(u)]
+        if order_by is not None:
+            present = [u for u in users if getattr(u, order_by) is not None]
+            present.sort(key=lambda u: (getattr(u, order_by), u.id),
+                         reverse=reverse)
+            users = present + sorted(
+                (u for u in users if getattr(u, order_by) is None),
+                key=lambda u: u.id, reverse=reverse)
+        return [u.id for u in users][:limit]
+
+    def check(self, query, expected, ordered=True):
+        """ Compare the IDs of a query with the expected ones, and check
+        it runs in SQL
+        """
+        ids = [u.id for u in query.all()]
+        if ordered:
+            self.assertEqual(ids, expected)
+        else:
+            self.assertEqual(sorted(ids), sorted(expected))
+        self.assertIn("SQLite index columns", query.explain())
+
+    def test_equality(self):
+        """ An equality on an index column """
+        self.check(User.query().where("email", eq="user42@example.com"),
+                   self.expected(lambda u: u.email == "user42@example.com"),
+                   False)
+
+    def test_prefix(self):
+        """ A prefix on an index column """
+        self.check(User.query().where("email", prefix="user1"),
+                   self.expected(lambda u: (u.email or "")
+                                 .startswith("user1")), False)
+
+    def test_range_between_seconds(self):
+        """ Bounds with microseconds, as stored timestamps have none """
+        low = START + timedelta(seconds=3, microseconds=500)
+        high = START + timedelta(seconds=9, microseconds=500)
+        self.check(User.query().where("created_at", gt=low, lt=high)
+                   .order_by("created_at"),
+                   self.expected(lambda u: low < u.created_at < high,
+                                 "created_at"))
+
+    def test_order_and_limit(self):
+        """ Ordering with ties, NULL last, and a pushed down limit """
+        self.check(User.query().order_by("created_at", reverse=True)
+                   .limit(7),
+                   self.expected(lambda u: True, "created_at", True, 7))
+        self.check(User.query().order_by("email"),
+                   self.expected(lambda u: True, "email"))
+
+    def test_condition_outside_columns(self):
+        """ Conditions without a column are checked on the objects """
+        self.check(User.query().where("first_name", eq="First1")
+                   .where("email", prefix="user").order_by("email")
+                   .limit(4),
+                   self.expected(lambda u: u.first_name == "First1" and
+                                 (u.email or "").startswith("user"),
+                                 "email", False, 4))
+
+    def test_no_column(self):
+        """ Without a usable column the planner scans all objects """
+        query = User.query().where("first_name", eq="First2")
+        self.assertIn("full scan", query.explain())
+        self.assertEqual(sorted(u.id for u in query.all()),
+                         sorted(self.expected(
+                             lambda u: u.first_name == "First2")))
+
+
+if __name__ == "__main__":
+    unittest.main()